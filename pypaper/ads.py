@@ -1,5 +1,6 @@
 import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 #Third party
 import bibtexparser
@@ -11,6 +12,19 @@ from . import bib
 
 ads.config.token = config.config['ADS']['token']
 
+#exports are prefetched on their own executor so they never queue behind PDF downloads
+export_executor = ThreadPoolExecutor(max_workers=2)
+download_executor = ThreadPoolExecutor(max_workers=2)
+
+#bibcodes per search query when fetching citations
+CITATION_BATCH = 50
+
+
+def _export_bibtex(bibcodes):
+    return ads.ExportQuery(
+        bibcodes=bibcodes,
+        format='bibtex',
+    ).execute()
 
 
 def get_bibtex_from_ADS(arg_dict):
@@ -35,6 +49,9 @@ def get_bibtex_from_ADS(arg_dict):
             et_al = ''
         opts_ += [f'{paper.author[0]} {et_al}[{paper.year}]: {paper.title}' ]
 
+    #export all results while the user is choosing
+    prefetch = export_executor.submit(_export_bibtex, [paper.bibcode for paper in papers])
+
     questions = [
         inquirer.Checkbox('ads',
             message="Add to bibtex and attempt PDF fetch?",
@@ -42,36 +59,75 @@ def get_bibtex_from_ADS(arg_dict):
         ),
     ]
     answers = inquirer.prompt(questions)
+    if answers is None:
+        prefetch.cancel()
+        return
 
     save_papers = []
     for ans in answers['ads']:
         save_papers.append(papers[opts_.index(ans)])
 
     if len(save_papers) == 0:
+        prefetch.cancel()
         return 
 
     papers = save_papers
     del save_papers
 
-    parser = bib.get_parser()
-
     bibcodes = [paper.bibcode for paper in papers]
 
-    bibtex_data = bibtex_query = ads.ExportQuery(
-        bibcodes=bibcodes,
-        format='bibtex',
-    ).execute()
-
-    bib_database = bibtexparser.loads(bibtex_data, parser)
+    try:
+        bibtex_data = prefetch.result()
+    except Exception:
+        bibtex_data = ''
+    entries = {
+        entry['ID']: entry
+        for entry in bibtexparser.loads(bibtex_data, bib.get_parser()).entries
+    }
+
+    missing = [bibcode for bibcode in bibcodes if bibcode not in entries]
+    if len(missing) > 0:
+        bibtex_data = _export_bibtex(missing)
+        for entry in bibtexparser.loads(bibtex_data, bib.get_parser()).entries:
+            entries[entry['ID']] = entry
+
+    bib_database = bibtexparser.bibdatabase.BibDatabase()
+    bib_database.entries = [entries[bibcode] for bibcode in bibcodes if bibcode in entries]
+    bibcodes = [entry['ID'] for entry in bib_database.entries]
 
     return bib_database, bibcodes
 
 
-def get_PDF_from_ADS(bibcodes, bib_ids):
+def get_citations_from_ADS(bibcodes, batch_size=CITATION_BATCH):
+    '''Fetch references and citations of the bibcodes in batched queries.
+
+    Returns a dict of requested bibcode to (references, citations), ADS may
+    answer with the canonical bibcode of a paper so alternate identifiers
+    are mapped back to the requested ones.
+    '''
+    edges = {}
+    for start in range(0, len(bibcodes), batch_size):
+        batch = bibcodes[start:(start + batch_size)]
+        papers = ads.SearchQuery(
+            q='bibcode:(' + ' OR '.join(f'"{bibcode}"' for bibcode in batch) + ')',
+            fl=['bibcode', 'identifier', 'reference', 'citation'],
+            rows=len(batch),
+        )
+        requested = set(batch)
+        for paper in papers:
+            keys = set(paper.identifier or []) | {paper.bibcode}
+            for bibcode in keys & requested:
+                edges[bibcode] = (paper.reference or [], paper.citation or [])
+    return edges
+
+
+def get_PDF_from_ADS(bibcodes, bib_ids, store, verbose=True):
+    '''Download PDFs of the given bibcodes into the store, returns the number of PDFs saved'''
+    found = 0
     for bibcode, bib_id in zip(bibcodes, bib_ids):
-        paper_path = config.PAPERS_FOLDER / f'{bib_id}.pdf'
-        if paper_path.exists():
+        if bib_id in store:
             continue
+        paper_path = config.BLOB_FOLDER / f'{bib_id}.part'
 
         sources = ['EPRINT_PDF', 'ADS_PDF', 'PUB_PDF']
         for source in sources:
@@ -83,6 +139,8 @@ def get_PDF_from_ADS(bibcodes, bib_ids):
                 '-o',
                 str(paper_path),
             ]
+            if not verbose:
+                cmd.insert(1, '-s')
             subprocess.run(cmd)
 
             lines = 0
@@ -105,7 +163,28 @@ def get_PDF_from_ADS(bibcodes, bib_ids):
                 break
             else:
                 os.remove(paper_path)
-        if keep_:
-            print('PDF found and saved to database')
-        else:
+        if keep_ and paper_path.exists():
+            store.add(paper_path, bib_id)
+            found += 1
+            if verbose:
+                print('PDF found and saved to database')
+        elif verbose:
             print('No PDF source was available')
+    return found
+
+
+def fetch_PDF_from_ADS(bibcodes, bib_ids, store):
+    '''Download PDFs in the background and report when all downloads are finished'''
+    future = download_executor.submit(get_PDF_from_ADS, bibcodes, bib_ids, store, verbose=False)
+
+    def report(future):
+        if future.cancelled():
+            return
+        err = future.exception()
+        if err is not None:
+            print(f'\n{config.Terminal.RED}Background PDF fetch failed: {err}{config.Terminal.END}')
+        else:
+            print(f'\nBackground PDF fetch finished: {future.result()}/{len(bibcodes)} PDFs saved to database')
+
+    future.add_done_callback(report)
+    return future
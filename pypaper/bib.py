@@ -1,10 +1,15 @@
+import os
 import pathlib
+import re
+import unicodedata
 
 import bibtexparser
 from bibtexparser.bparser import BibTexParser
+from bibtexparser.bwriter import BibTexWriter
 import inquirer
 
 from . import config
+from . import tags
 
 def get_parser():
     parser = BibTexParser(common_strings=True, interpolate_strings=False)
@@ -15,8 +20,6 @@ def get_parser():
 
 def load_bibtex(paths):
 
-    parser = get_parser()
-
     if isinstance(paths, pathlib.Path):
         paths = [paths]
 
@@ -31,8 +34,73 @@ def load_bibtex(paths):
         with open(path, 'r') as bibtex_file:
             bib_data += bibtex_file.read()
 
-    bib_database = bibtexparser.loads(bib_data, parser)
-    return bib_database
+    return loads_bibtex(bib_data)
+
+
+def loads_bibtex(bib_data):
+    if len(bib_data.strip()) == 0:
+        return bibtexparser.bibdatabase.BibDatabase()
+    return bibtexparser.loads(bib_data, get_parser())
+
+
+_LATEX_LETTERS = {
+    'ss': 'ss',
+    'ae': 'ae',
+    'AE': 'AE',
+    'oe': 'oe',
+    'OE': 'OE',
+    'aa': 'a',
+    'AA': 'A',
+    'o': 'o',
+    'O': 'O',
+    'l': 'l',
+    'L': 'L',
+    'i': 'i',
+    'j': 'j',
+}
+
+_LATEX_ACCENT = re.compile(r'\\(?:[\'"`^~=.]|[uvHckrbd](?![a-zA-Z]))\s*')
+_LATEX_LETTER = re.compile(r'\\(' + '|'.join(_LATEX_LETTERS) + r')(?![a-zA-Z])\s*')
+_LATEX_COMMAND = re.compile(r'\\[a-zA-Z]+\s*')
+_NON_WORD = re.compile(r'[\W_]+')
+_SPACE = re.compile(r'\s+')
+
+
+def strip_accents(value):
+    if value.isascii():
+        return value
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+
+def fold_text(value):
+    '''Fold a bibtex field value to lowercase text without LaTeX escapes, braces, accents and repeated whitespace'''
+    value = str(value)
+    value = _LATEX_LETTER.sub(lambda m: _LATEX_LETTERS[m.group(1)], value)
+    value = _LATEX_ACCENT.sub('', value)
+    value = _LATEX_COMMAND.sub(' ', value)
+    value = value.replace('{', '').replace('}', '')
+    value = strip_accents(value)
+    return _SPACE.sub(' ', value.lower()).strip()
+
+
+def normalize_text(value):
+    '''Fold a bibtex field value to plain lowercase ascii words, ignoring LaTeX escapes, braces and accents'''
+    return _NON_WORD.sub(' ', fold_text(value)).strip()
+
+
+def author_last_names(auth):
+    '''List the normalized last names of a bibtex author field'''
+    names = []
+    for name in re.split(r'\s+and\s+', str(auth)):
+        if ',' in name:
+            last = name.split(',')[0]
+        else:
+            last = name.strip().split(' ')[-1]
+        last = normalize_text(last)
+        if len(last) > 0:
+            names.append(last)
+    return names
 
 
 def _format_author(auth):
@@ -50,7 +118,9 @@ def _clean_id(field):
 
 
 def rename_bibtex(bib_database):
+    '''Harmonize the IDs of all entries, returns a dict of changed IDs from old to new'''
     tlen_ = int(config.config['General']['title include'])
+    renames = {}
     for entry in bib_database.entries:
 
         if 'title' not in entry:
@@ -95,9 +165,103 @@ def rename_bibtex(bib_database):
                     + title_str
         new_id = ''.join(e for e in new_id if e.isalnum() or e == '_')
 
+        if entry['ID'] != new_id:
+            renames[entry['ID']] = new_id
         entry['ID'] = new_id
 
+    for entry in bib_database.entries:
+        if 'crossref' in entry and str(entry['crossref']) in renames:
+            entry['crossref'] = renames[str(entry['crossref'])]
+
+    return renames
+
+
+def merge_entries(entry, other):
+    '''Fill fields missing in `entry` from `other` and combine their tags'''
+    for key in other:
+        if key in ['ID', 'ENTRYTYPE', 'tags']:
+            continue
+        if key not in entry:
+            entry[key] = other[key]
+    if 'tags' in other:
+        current_tags = tags.split_tags(entry.get('tags', ''))
+        current_tags = tags.update_tags(current_tags, tags.split_tags(other['tags']), [])
+        entry['tags'] = tags.join_tags(current_tags)
+
+
+_CHUNK_START = re.compile(r'^(?=@)', re.MULTILINE)
+_ENTRY_HEAD = re.compile(r'@\s*(\w+)\s*[{(]\s*([^,\s]+)\s*,')
+
+
+def split_chunks(bib_data):
+    '''Split bibtex text into the chunks starting at each "@" at the beginning of a line'''
+    return [chunk for chunk in _CHUNK_START.split(bib_data) if len(chunk.strip()) > 0]
+
+
+def chunk_id(chunk):
+    '''ID of the entry in a chunk, None for strings, preambles, comments and unparsable text'''
+    match = _ENTRY_HEAD.match(chunk)
+    if match is None or match.group(1).lower() in ['string', 'preamble', 'comment']:
+        return None
+    return match.group(2)
+
+
+class CachedWriter:
+    '''BibTeX writer keeping the entry order and the text of unchanged entries.
+
+    The text of every entry is cached together with a shallow copy of the
+    entry, only entries that no longer equal their copy are serialized again
+    so a save costs in proportion to the number of changed entries.
+    '''
+
+    def __init__(self):
+        self.writer = BibTexWriter()
+        self.writer.order_entries_by = None
+        self.cache = {}
+
+    def seed(self, bib_data, bib_database):
+        '''Cache the text of the entries in the loaded file so entries that are never changed keep their formatting.
+
+        Has to be given the database as parsed from `bib_data`, before any
+        changes such as renaming, so the cached copies match the text.
+        '''
+        entries = {entry['ID']: entry for entry in bib_database.entries}
+        for chunk in split_chunks(bib_data):
+            bib_id = chunk_id(chunk)
+            if bib_id in entries and len(_ENTRY_HEAD.findall(chunk)) == 1:
+                self.cache[bib_id] = (dict(entries[bib_id]), chunk.rstrip() + '\n')
+
+    def dumps(self, bib_database):
+        head = bibtexparser.bibdatabase.BibDatabase()
+        head.comments = bib_database.comments
+        head.preambles = bib_database.preambles
+        head.strings = bib_database.strings
+
+        cache = {}
+        texts = []
+        for entry in bib_database.entries:
+            cached = self.cache.get(entry['ID'])
+            if cached is None or cached[0] != entry:
+                single = bibtexparser.bibdatabase.BibDatabase()
+                single.entries = [entry]
+                cached = (dict(entry), self.writer.write(single))
+            cache[entry['ID']] = cached
+            texts.append(cached[1])
+        self.cache = cache
+
+        return self.writer.write(head) + self.writer.entry_separator.join(texts)
+
 
-def save_bibtex(path, bib_database):
-    with open(path, 'w+') as bibtex_file:
-        bibtexparser.dump(bib_database, bibtex_file)
\ No newline at end of file
+def save_bibtex(path, bib_database, writer=None):
+    '''Write the database in one write to a temporary file that atomically replaces `path`, returns the written text'''
+    if writer is None:
+        writer = CachedWriter()
+    path = pathlib.Path(path).resolve()
+    bib_data = writer.dumps(bib_database)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as bibtex_file:
+        bibtex_file.write(bib_data)
+        bibtex_file.flush()
+        os.fsync(bibtex_file.fileno())
+    os.replace(tmp_path, path)
+    return bib_data
@@ -0,0 +1,193 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from . import bib
+
+NUMERIC_COLUMNS = ['year']
+CATEGORY_COLUMNS = ['ENTRYTYPE']
+
+_NUMBER = re.compile(r'\s*\{?\s*(-?\d+)\s*\}?\s*')
+_RANGE = re.compile(r'\s*(-?\d+)?\s*\.\.\s*(-?\d+)?\s*')
+_YEAR = re.compile(r'\s*\d{4}\s*')
+
+
+def parse_number(value):
+    '''Integer value of a bibtex field such as "2018" or "{2018}", None if it is not a number'''
+    match = _NUMBER.fullmatch(str(value))
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def from_positions(positions, size):
+    '''Bitmap with the bits of the given entry positions set'''
+    bits = bytearray(size//8 + 1)
+    for id_ in positions:
+        bits[id_ >> 3] |= 1 << (id_ & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def positions(bitmap):
+    '''Sorted entry positions of the set bits of a bitmap'''
+    bits = bin(bitmap)[:1:-1]
+    ids = []
+    id_ = bits.find('1')
+    while id_ != -1:
+        ids.append(id_)
+        id_ = bits.find('1', id_ + 1)
+    return ids
+
+
+class ColumnIndex:
+    '''Typed columns of bibtex fields for comparison and range predicates.
+
+    Numeric fields are stored as an array of values sorted together with an
+    array of entry positions so ranges are found by bisection, categorical
+    fields as one integer bitmap per value. Selections are returned as
+    bitmaps with bit i set for entry position i.
+    '''
+
+    def __init__(self, entries=None):
+        self.size = 0
+        self.numeric = {}
+        self.categories = {}
+        self.keys = {key.lower(): key for key in NUMERIC_COLUMNS + CATEGORY_COLUMNS}
+        if entries is not None:
+            self.build(entries)
+
+    def build(self, entries):
+        self.size = len(entries)
+        for key in NUMERIC_COLUMNS:
+            values = []
+            for id_, entry in enumerate(entries):
+                if key in entry:
+                    value = parse_number(entry[key])
+                    if value is not None:
+                        values.append((value, id_))
+            values.sort()
+            self.numeric[key] = (
+                array('q', [value for value, _ in values]),
+                array('q', [id_ for _, id_ in values]),
+            )
+
+        for key in CATEGORY_COLUMNS:
+            groups = {}
+            for id_, entry in enumerate(entries):
+                if key in entry:
+                    groups.setdefault(str(entry[key]).lower(), []).append(id_)
+            self.categories[key] = {
+                value: from_positions(ids, self.size)
+                for value, ids in groups.items()
+            }
+
+    def add(self, id_, entry):
+        '''Add an entry appended at position `id_`'''
+        self.size = max(self.size, id_ + 1)
+        for key, (values, ids) in self.numeric.items():
+            if key not in entry:
+                continue
+            value = parse_number(entry[key])
+            if value is None:
+                continue
+            #sorted by value and position as in build
+            index = bisect_right(values, value)
+            values.insert(index, value)
+            ids.insert(index, id_)
+
+        for key, groups in self.categories.items():
+            if key in entry:
+                value = str(entry[key]).lower()
+                groups[value] = groups.get(value, 0) | (1 << id_)
+
+    def column(self, key):
+        '''Name of the indexed column matching a search key, None if it is not indexed'''
+        return self.keys.get(key.lower())
+
+    def select(self, key, op, pattern):
+        '''Bitmap of the entries where `key op pattern` holds.
+
+        Numeric columns support "<", "<=", ">", ">=", "=a..b" ranges with open
+        ends and "=" with a full four digit year, any other "=" pattern stays a
+        regex on the raw value. Categorical columns match the pattern as a
+        case insensitive regex against their values. Returns None if the
+        predicate cannot be served by a column.
+        '''
+        key = self.column(key)
+        if key is None:
+            return None
+        if key in self.categories:
+            if op != '=':
+                return None
+            bitmap = 0
+            for value, value_bitmap in self.categories[key].items():
+                if re.search(pattern, value, re.IGNORECASE):
+                    bitmap |= value_bitmap
+            return bitmap
+
+        values, ids = self.numeric[key]
+        if op == '=':
+            match = _RANGE.fullmatch(pattern)
+            if match is not None:
+                low, high = match.groups()
+                start = 0 if low is None else bisect_left(values, int(low))
+                stop = len(values) if high is None else bisect_right(values, int(high))
+            else:
+                #partial numbers such as year=201 keep their regex meaning
+                if _YEAR.fullmatch(pattern) is None:
+                    return None
+                value = int(pattern)
+                start = bisect_left(values, value)
+                stop = bisect_right(values, value)
+        else:
+            value = parse_number(pattern)
+            if value is None:
+                return None
+            if op == '<':
+                start, stop = 0, bisect_left(values, value)
+            elif op == '<=':
+                start, stop = 0, bisect_right(values, value)
+            elif op == '>':
+                start, stop = bisect_right(values, value), len(values)
+            else:
+                start, stop = bisect_left(values, value), len(values)
+        return from_positions(ids[start:stop], self.size)
+
+
+class FoldedColumns:
+    '''Shadow columns of field values folded by `bib.fold_text` for LaTeX, brace, accent and case insensitive search.
+
+    A field is folded once for all entries the first time it is searched and
+    the column is then kept up to date as entries are added or changed, so
+    queries never fold field values again.
+    '''
+
+    def __init__(self, entries=None):
+        self.entries = []
+        self.columns = {}
+        if entries is not None:
+            self.build(entries)
+
+    def build(self, entries):
+        self.entries = entries
+        self.columns = {}
+
+    def _fold(self, entry, key):
+        if key not in entry:
+            return None
+        return bib.fold_text(entry[key])
+
+    def get(self, key):
+        '''Folded values of a field by entry position, None where the field is missing'''
+        if key not in self.columns:
+            self.columns[key] = [self._fold(entry, key) for entry in self.entries]
+        return self.columns[key]
+
+    def add(self, id_, entry):
+        '''Add an entry appended at position `id_`'''
+        for key, column in self.columns.items():
+            column.append(self._fold(entry, key))
+
+    def update(self, id_, entry):
+        for key, column in self.columns.items():
+            column[id_] = self._fold(entry, key)
@@ -45,11 +45,21 @@ DEFAULT = {
         'path': str(HOME / 'pypapers'),
         'viewer': 'okular',
         'title include': 0,
+        'fold search': 0,
+        'watch': 0,
+        'watch interval': 2,
+        'auto merge': 0,
     },
     'ADS': {
         'token': 'place your personal token here',
         'max results': 20,
     },
+    'Dedup': {
+        'threshold': 0.5,
+        'bands': 16,
+        'rows': 4,
+        'pickup check': 0,
+    },
 }
 
 config.read_dict(DEFAULT)
@@ -64,8 +74,12 @@ DATA_FOLDER = pathlib.Path(config['General']['path'])
 
 PICKUP_FOLDER = DATA_FOLDER / 'PICKUP'
 BIB_FILE = DATA_FOLDER / 'references.bib'
+LOCK_FILE = DATA_FOLDER / '.references.lock'
 PAPERS_FOLDER = DATA_FOLDER / 'PAPERS'
+BLOB_FOLDER = DATA_FOLDER / 'BLOBS'
+MANIFEST_FILE = DATA_FOLDER / 'manifest.json'
 TRASH_FOLDER = DATA_FOLDER / 'TRASH'
+CACHE_FOLDER = DATA_FOLDER / '.cache'
 
 DATA_FOLDER.mkdir(parents=True, exist_ok=True)
 
@@ -75,4 +89,6 @@ if not BIB_FILE.exists():
 DATA_FOLDER.mkdir(parents=True, exist_ok=True)
 PICKUP_FOLDER.mkdir(exist_ok=True)
 PAPERS_FOLDER.mkdir(exist_ok=True)
+BLOB_FOLDER.mkdir(exist_ok=True)
 TRASH_FOLDER.mkdir(exist_ok=True)
+CACHE_FOLDER.mkdir(exist_ok=True)
@@ -0,0 +1,47 @@
+class ResultCursor:
+    '''Lazily evaluated list of matching bibtex entry positions.
+
+    Matches are only pulled from the underlying iterator until the requested
+    page is filled, already found matches are kept so paging back and forth
+    never re-runs the query and list indices stay stable.
+    '''
+
+    def __init__(self, matches):
+        self._iter = iter(matches)
+        self.matches = []
+        self.exhausted = False
+        self.offset = 0
+
+    def fill(self, num=None):
+        '''Pull matches until `num` are found or the iterator is exhausted, all if `num` is None'''
+        while not self.exhausted and (num is None or len(self.matches) < num):
+            try:
+                self.matches.append(next(self._iter))
+            except StopIteration:
+                self.exhausted = True
+
+    def __getitem__(self, index):
+        if index < 0:
+            raise IndexError('Negative cursor index')
+        self.fill(index + 1)
+        return self.matches[index]
+
+    def page(self, limit):
+        '''The list positions and entry positions of the page at the current offset'''
+        self.fill(self.offset + limit)
+        ids = self.matches[self.offset:(self.offset + limit)]
+        return list(enumerate(ids, start=self.offset))
+
+    def has_next(self, limit):
+        self.fill(self.offset + limit + 1)
+        return len(self.matches) > self.offset + limit
+
+    def all(self):
+        self.fill()
+        return self.matches
+
+    def found(self):
+        '''Number of matches found so far as a string, with a "+" if there may be more'''
+        if self.exhausted:
+            return str(len(self.matches))
+        return f'{len(self.matches)}+'
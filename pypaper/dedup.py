@@ -0,0 +1,188 @@
+import hashlib
+import json
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import config
+from . import bib
+
+_MASK = (1 << 64) - 1
+_SEED = 333
+
+
+def entry_shingles(entry):
+    '''Set of normalized title word uni- and bigrams together with the leading author last names'''
+    shingles = set()
+    if 'title' in entry:
+        words = bib.normalize_text(entry['title']).split()
+        shingles.update(f't:{word}' for word in words)
+        shingles.update(f't:{a} {b}' for a, b in zip(words[:-1], words[1:]))
+    if 'author' in entry:
+        names = bib.author_last_names(entry['author'])
+        # Only the first authors as author lists are often truncated
+        shingles.update(f'a:{name}' for name in names[:3])
+    return shingles
+
+
+def _hash_shingle(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little')
+
+
+class MinHasher:
+    '''MinHash using multiply-shift hashing of 64 bit shingle hashes, vectorized when numpy is available'''
+
+    def __init__(self, num_perm, seed=_SEED):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.perms = [
+            (rng.randrange(1, 1 << 64) | 1, rng.randrange(0, 1 << 64))
+            for _ in range(num_perm)
+        ]
+        if np is not None:
+            self._a = np.array([a for a, _ in self.perms], dtype=np.uint64)[:, None]
+            self._b = np.array([b for _, b in self.perms], dtype=np.uint64)[:, None]
+
+    def signature(self, shingles):
+        hashes = [_hash_shingle(shingle) for shingle in shingles]
+        if len(hashes) == 0:
+            return None
+        if np is not None:
+            h = np.array(hashes, dtype=np.uint64)[None, :]
+            return ((self._a*h + self._b) >> np.uint64(32)).min(axis=1).tolist()
+        return [min(((a*h + b) & _MASK) >> 32 for h in hashes) for a, b in self.perms]
+
+
+def similarity(sig1, sig2):
+    '''Estimated Jaccard similarity of two MinHash signatures'''
+    same = sum(1 for x, y in zip(sig1, sig2) if x == y)
+    return same/len(sig1)
+
+
+class SignatureCache:
+    '''Signatures stored on disk keyed by a digest of the title and author fields so only new or changed entries are hashed'''
+
+    def __init__(self, hasher, path=None):
+        if path is None:
+            path = config.CACHE_FOLDER / 'minhash.json'
+        self.path = path
+        self.hasher = hasher
+        self.signatures = {}
+        self.modified = False
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('num_perm') == self.hasher.num_perm and data.get('seed') == _SEED:
+            self.signatures = data['signatures']
+
+    def save(self):
+        if not self.modified:
+            return
+        with open(self.path, 'w') as f:
+            json.dump({
+                'num_perm': self.hasher.num_perm,
+                'seed': _SEED,
+                'signatures': self.signatures,
+            }, f)
+        self.modified = False
+
+    def get(self, entry):
+        key = f'{entry.get("title", "")}\n{entry.get("author", "")}'
+        key = hashlib.sha1(key.encode()).hexdigest()
+        if key not in self.signatures:
+            self.signatures[key] = self.hasher.signature(entry_shingles(entry))
+            self.modified = True
+        return self.signatures[key]
+
+
+class LSHIndex:
+    '''Locality-sensitive hashing of MinHash signatures by banding'''
+
+    def __init__(self, bands, rows):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def _band_keys(self, sig):
+        for band in range(self.bands):
+            yield band, tuple(sig[(band*self.rows):((band + 1)*self.rows)])
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for band, band_key in self._band_keys(sig):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+    def candidates(self, sig):
+        keys = set()
+        for band, band_key in self._band_keys(sig):
+            keys.update(self.buckets[band].get(band_key, []))
+        return keys
+
+    def query(self, sig, threshold):
+        '''Keys of indexed signatures similar to `sig`, most similar first'''
+        matches = []
+        for key in self.candidates(sig):
+            sim = similarity(sig, self.signatures[key])
+            if sim >= threshold:
+                matches.append((sim, key))
+        matches.sort(key=lambda x: -x[0])
+        return matches
+
+    def clusters(self, threshold):
+        '''Group all indexed keys connected by candidate pairs above `threshold`'''
+        parent = {key: key for key in self.signatures}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for buckets in self.buckets:
+            for keys in buckets.values():
+                if len(keys) < 2:
+                    continue
+                for i, key1 in enumerate(keys):
+                    for key2 in keys[(i + 1):]:
+                        if find(key1) == find(key2):
+                            continue
+                        if similarity(self.signatures[key1], self.signatures[key2]) >= threshold:
+                            parent[find(key2)] = find(key1)
+
+        groups = {}
+        for key in self.signatures:
+            groups.setdefault(find(key), []).append(key)
+        return [sorted(keys) for keys in groups.values() if len(keys) > 1]
+
+
+def build_index(entries, cache=None):
+    '''Build a LSH index of the entries keyed by their list position'''
+    bands = int(config.config['Dedup']['bands'])
+    rows = int(config.config['Dedup']['rows'])
+    if cache is None:
+        cache = SignatureCache(MinHasher(bands*rows))
+    index = LSHIndex(bands, rows)
+    for id_, entry in enumerate(entries):
+        sig = cache.get(entry)
+        if sig is not None:
+            index.add(id_, sig)
+    cache.save()
+    return index, cache
+
+
+def find_duplicates(entries):
+    '''Clusters of entry positions that are likely duplicates of each other'''
+    threshold = float(config.config['Dedup']['threshold'])
+    index, _ = build_index(entries)
+    return index.clusters(threshold)
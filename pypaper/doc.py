@@ -5,7 +5,9 @@ from pdfminer.converter import TextConverter
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.layout import LAParams
 import codecs
+import re
 from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
 
 class MyTextConverter(TextConverter):
     def __init__(self, *args, **kwargs):
@@ -16,7 +18,7 @@ class MyTextConverter(TextConverter):
         self.text_output.append(text)
 
 
-def parse_pdf(path):
+def parse_pdf(path, maxpages=0):
 
     fd = open(path, 'rb')
     retstr = StringIO()
@@ -27,7 +29,7 @@ def parse_pdf(path):
     rmngr = PDFResourceManager(caching=True)
     device = MyTextConverter(rmngr, retstr, laparams=laparams, imagewriter=None)
     interpreter = PDFPageInterpreter(rmngr, device)
-    for page in PDFPage.get_pages(fd, set(), check_extractable=True):
+    for page in PDFPage.get_pages(fd, set(), maxpages=maxpages, check_extractable=True):
         interpreter.process_page(page)
     fulltext = (''.join(device.text_output)).strip()
     fd.close()
@@ -35,4 +37,30 @@ def parse_pdf(path):
         return []
     lines = fulltext.split("\n")
 
-    return lines
\ No newline at end of file
+    return lines
+
+
+DOI_RE = re.compile(r'\b(10\.\d{4,9}/[^\s"<>]+)')
+
+
+def parse_front_page(path):
+    '''Extract the text lines and DOIs of the first page of a PDF'''
+    try:
+        lines = parse_pdf(path, maxpages=1)
+    except Exception:
+        return {'lines': [], 'dois': []}
+    lines = [line.strip() for line in lines if len(line.strip()) > 0]
+    dois = []
+    for line in lines:
+        for doi in DOI_RE.findall(line):
+            doi = doi.rstrip('.,;)').lower()
+            if doi not in dois:
+                dois.append(doi)
+    return {'lines': lines, 'dois': dois}
+
+
+def parse_front_pages(paths, workers=None):
+    '''Parse the first page of many PDFs in parallel processes'''
+    paths = [str(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse_front_page, paths))
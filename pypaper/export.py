@@ -0,0 +1,142 @@
+import pathlib
+import re
+
+import bibtexparser
+import bibtexparser.bwriter
+
+# \cite, \citep, \parencite, \textcite*, \nocite ... with optional [..] arguments take one
+# key group, \cites, \parencites ... take several directly following groups
+CITE_RE = re.compile(
+    r'\\(?:[a-zA-Z]*cites(?![a-zA-Z])\*?'
+    r'((?:\s*\([^)]*\))*\s*(?:\[[^\]]*\]\s*)*\{[^}]*\}(?:(?:\[[^\]]*\])*\{[^}]*\})*)'
+    r'|(?:[a-zA-Z]*cite[a-zA-Z]*|nocite)\*?(\s*(?:\[[^\]]*\]\s*)*\{[^}]*\}))'
+)
+CITE_OPT_RE = re.compile(r'\[[^\]]*\]|\([^)]*\)')
+CITE_ARG_RE = re.compile(r'\{([^}]*)\}')
+AUX_RE = re.compile(r'\\(?:citation|abx@aux@cite(?:\{[^}]*\})?)\{([^}]*)\}')
+BCF_RE = re.compile(r'<bcf:citekey[^>]*>([^<]*)</bcf:citekey>')
+COMMENT_RE = re.compile(r'(?<!\\)%.*')
+
+
+def _add_keys(keys, arg):
+    for key in arg.split(','):
+        key = key.strip()
+        if len(key) > 0 and key not in keys:
+            keys[key] = None
+
+
+def _scan_tex(path, keys):
+    with open(path, 'r', errors='replace') as f:
+        text = COMMENT_RE.sub('', f.read())
+    for match in CITE_RE.finditer(text):
+        args = CITE_OPT_RE.sub('', match.group(1) or match.group(2))
+        for arg in CITE_ARG_RE.findall(args):
+            _add_keys(keys, arg)
+
+
+def _scan_lines(path, regex, keys):
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            for arg in regex.findall(line):
+                _add_keys(keys, arg)
+
+
+def project_files(path):
+    '''Files to collect citations from, the .bcf/.aux files written by LaTeX are preferred over the sources'''
+    path = pathlib.Path(path)
+    if path.is_file():
+        return [path]
+    for suffix in ['bcf', 'aux', 'tex']:
+        files = sorted(path.rglob(f'*.{suffix}'))
+        if len(files) > 0:
+            return files
+    return []
+
+
+def collect_citations(files):
+    '''Ordered list of unique citation keys in the given .tex, .aux and .bcf files'''
+    keys = {}
+    for path in files:
+        path = pathlib.Path(path)
+        if path.suffix == '.aux':
+            _scan_lines(path, AUX_RE, keys)
+        elif path.suffix == '.bcf':
+            _scan_lines(path, BCF_RE, keys)
+        else:
+            _scan_tex(path, keys)
+    return list(keys)
+
+
+def _string_names(value, names):
+    if isinstance(value, bibtexparser.bibdatabase.BibDataStringExpression):
+        for part in value.expr:
+            if isinstance(part, bibtexparser.bibdatabase.BibDataString):
+                names.add(part.name)
+
+
+def subset_database(bib_database, id_index, keys):
+    '''Database of the cited entries, their crossref parents and the strings they use.
+
+    Returns the database and a list of keys that could not be resolved.
+    '''
+    if '*' in keys:
+        keys = [entry['ID'] for entry in bib_database.entries]
+
+    ids = {}
+    missing = []
+    for key in keys:
+        if key not in id_index:
+            missing.append(key)
+            continue
+        ids[id_index[key]] = None
+
+    #crossref parents have to come after the children referencing them
+    parents = {}
+    for id_ in list(ids):
+        entry = bib_database.entries[id_]
+        while 'crossref' in entry:
+            parent = str(entry['crossref']).strip('{} ')
+            if parent not in id_index:
+                missing.append(parent)
+                break
+            pid_ = id_index[parent]
+            if pid_ in parents:
+                break
+            parents[pid_] = None
+            entry = bib_database.entries[pid_]
+    for pid_ in parents:
+        ids.pop(pid_, None)
+
+    subset = bibtexparser.bibdatabase.BibDatabase()
+    subset.entries = [bib_database.entries[id_] for id_ in list(ids) + list(parents)]
+
+    names = set()
+    for entry in subset.entries:
+        for value in entry.values():
+            _string_names(value, names)
+    needed = set()
+    while len(names) > 0:
+        name = names.pop()
+        if name in needed or name not in bib_database.strings:
+            continue
+        needed.add(name)
+        _string_names(bib_database.strings[name], names)
+
+    #keep the database order as strings may be defined using earlier strings
+    for name, value in bib_database.strings.items():
+        if name in needed:
+            subset.strings[name] = value
+
+    return subset, missing
+
+
+def dumps_subset(bib_database):
+    '''Serialize the subset keeping the entry order so crossref parents stay after their children'''
+    writer = bibtexparser.bwriter.BibTexWriter()
+    writer.order_entries_by = None
+    return writer.write(bib_database)
+
+
+def save_subset(path, bib_database):
+    with open(path, 'w') as bibtex_file:
+        bibtex_file.write(dumps_subset(bib_database))
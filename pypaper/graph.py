@@ -0,0 +1,124 @@
+import os
+import pickle
+from array import array
+from urllib.parse import unquote
+
+from . import config
+
+
+def entry_bibcode(entry):
+    '''ADS bibcode of a bibtex entry taken from its adsurl, None if there is none'''
+    if 'adsurl' not in entry:
+        return None
+    bibcode = str(entry['adsurl']).replace('{', '').replace('}', '').strip()
+    bibcode = unquote(bibcode.rstrip('/').split('/')[-1])
+    if len(bibcode) == 0:
+        return None
+    return bibcode
+
+
+class CitationGraph:
+    '''Local citation graph of ADS bibcodes.
+
+    Bibcodes are numbered as they are first seen and the references and
+    citations of each node are kept as sorted arrays of node numbers. Only
+    the references are stored on disk, the citations are their reverse and
+    rebuilt on load. `fetched` holds the nodes whose edges were fetched
+    from ADS so updates only query new entries.
+    '''
+
+    def __init__(self, path=None):
+        if path is None:
+            path = config.CACHE_FOLDER / 'citations.pickle'
+        self.path = path
+        self.bibcodes = []
+        self.nodes = {}
+        self.references = {}
+        self.citations = {}
+        self.fetched = set()
+
+    def __contains__(self, bibcode):
+        node = self.nodes.get(bibcode)
+        return node is not None and node in self.fetched
+
+    def _node(self, bibcode):
+        node = self.nodes.get(bibcode)
+        if node is None:
+            node = len(self.bibcodes)
+            self.nodes[bibcode] = node
+            self.bibcodes.append(bibcode)
+        return node
+
+    def load(self):
+        self.bibcodes = []
+        self.nodes = {}
+        self.references = {}
+        self.citations = {}
+        self.fetched = set()
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        self.bibcodes = data['bibcodes']
+        self.nodes = {bibcode: node for node, bibcode in enumerate(self.bibcodes)}
+        self.references = data['references']
+        self.fetched = data['fetched']
+
+        citations = {}
+        for node, targets in self.references.items():
+            for target in targets:
+                citations.setdefault(target, []).append(node)
+        self.citations = {
+            node: array('I', sorted(sources))
+            for node, sources in citations.items()
+        }
+
+    def save(self):
+        tmp_file = self.path.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({
+                'bibcodes': self.bibcodes,
+                'references': self.references,
+                'fetched': self.fetched,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.path)
+
+    def _add_edges(self, adjacency, node, targets):
+        '''Merge targets into a sorted adjacency array, returns the new targets'''
+        current = adjacency.get(node, ())
+        new = set(targets) - set(current)
+        if len(new) > 0:
+            adjacency[node] = array('I', sorted(new.union(current)))
+        return new
+
+    def set_edges(self, bibcode, references, citations):
+        '''Add the references and citations fetched for a bibcode'''
+        node = self._node(bibcode)
+        for target in self._add_edges(self.references, node, [self._node(x) for x in references]):
+            self._add_edges(self.citations, target, [node])
+        for source in self._add_edges(self.citations, node, [self._node(x) for x in citations]):
+            self._add_edges(self.references, source, [node])
+        self.fetched.add(node)
+
+    def neighbours(self, bibcode, direction='references', hops=1):
+        '''Bibcodes reachable within `hops` steps along references or citations, in order of distance'''
+        adjacency = self.references if direction == 'references' else self.citations
+        start = self.nodes.get(bibcode)
+        if start is None:
+            return []
+        seen = {start}
+        frontier = [start]
+        found = []
+        for _ in range(hops):
+            next_frontier = []
+            for node in frontier:
+                for target in adjacency.get(node, ()):
+                    if target not in seen:
+                        seen.add(target)
+                        next_frontier.append(target)
+            found += next_frontier
+            frontier = next_frontier
+        return [self.bibcodes[node] for node in found]
@@ -0,0 +1,132 @@
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+try:
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+except ImportError:
+    PDFParser = None
+
+from . import config
+
+# Readers accept the header and the end-of-file marker within the first and last kilobyte
+HEADER_SIZE = 1024
+TRAILER_SIZE = 1024
+
+
+def _open_pdf(path):
+    with open(path, 'rb') as f:
+        document = PDFDocument(PDFParser(f))
+        next(PDFPage.create_pages(document), None)
+
+
+def check_pdf(path, deep=False):
+    '''Problem found with a PDF file, None if it looks intact.
+
+    Only the header and trailer are read through a memory map, with `deep`
+    the file is also opened with pdfminer when it is available.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 'empty file'
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header = data[:HEADER_SIZE]
+                trailer = data[-TRAILER_SIZE:]
+    except (OSError, ValueError) as err:
+        return f'unreadable ({err})'
+
+    if b'%PDF-' not in header:
+        if b'<html' in header.lower() or b'<!doctype html' in header.lower():
+            return 'HTML page'
+        return 'no PDF header'
+    if b'%%EOF' not in trailer:
+        return 'truncated, no %%EOF trailer'
+
+    if deep and PDFParser is not None:
+        try:
+            _open_pdf(path)
+        except Exception as err:
+            return f'pdfminer failed to open ({type(err).__name__})'
+    return None
+
+
+class ScanCache:
+    '''Results of earlier scans stored on disk keyed by file name, size and mtime so only changed files are checked again'''
+
+    def __init__(self, path=None):
+        if path is None:
+            path = config.CACHE_FOLDER / 'integrity.json'
+        self.path = path
+        self.results = {}
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.results = json.load(f)['results']
+        except (OSError, ValueError, KeyError):
+            return
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'results': self.results}, f)
+
+    def get(self, name, stat, deep):
+        '''Cached problem of a file or False if it has to be checked'''
+        if name not in self.results:
+            return False
+        size, mtime, deep_checked, problem = self.results[name]
+        if size != stat.st_size or mtime != stat.st_mtime_ns:
+            return False
+        if deep and not deep_checked and problem is None:
+            return False
+        return problem
+
+    def set(self, name, stat, deep, problem):
+        self.results[name] = [stat.st_size, stat.st_mtime_ns, deep, problem]
+
+
+def scan(folder, deep=False, workers=None, cache=None):
+    '''Check all PDFs in a folder in parallel.
+
+    Returns a dict of file name to problem (None if intact) and the number of
+    files that were actually checked rather than taken from the cache.
+    '''
+    if cache is None:
+        cache = ScanCache()
+    deep = deep and PDFParser is not None
+
+    results = {}
+    todo = []
+    for file in os.scandir(folder):
+        if not file.name.endswith('.pdf') or not file.is_file():
+            continue
+        stat = file.stat()
+        problem = cache.get(file.name, stat, deep)
+        if problem is False:
+            todo.append((file.name, stat))
+        else:
+            results[file.name] = problem
+
+    if len(todo) > 0:
+        paths = [str(folder / name) for name, _ in todo]
+        #pdfminer is pure python and needs processes, the memory mapped reads do fine in threads
+        if deep:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                problems = list(executor.map(check_pdf, paths, [deep]*len(paths), chunksize=8))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                problems = list(executor.map(check_pdf, paths))
+        for (name, stat), problem in zip(todo, problems):
+            results[name] = problem
+            cache.set(name, stat, deep, problem)
+
+    cache.results = {name: cache.results[name] for name in results if name in cache.results}
+    cache.save()
+    return results, len(todo)
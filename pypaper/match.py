@@ -0,0 +1,130 @@
+import difflib
+import math
+import re
+
+from . import bib
+
+_DOI_PREFIX = re.compile(r'^(https?://(dx\.)?doi\.org/|doi:)', re.IGNORECASE)
+
+# Only the top of the first page is expected to contain the title and authors
+FRONT_LINES = 40
+# Titles may be broken over a few lines
+TITLE_LINES = 3
+# Titles compared line by line per document
+CANDIDATES = 50
+# Matches proposed pre-selected for linking
+CONFIDENT = 0.9
+
+
+def normalize_doi(doi):
+    doi = str(doi).replace('{', '').replace('}', '').strip()
+    return _DOI_PREFIX.sub('', doi).lower()
+
+
+class LibraryIndex:
+    '''Inverted word index of library titles and a lookup table of DOIs'''
+
+    def __init__(self, entries, skip=None):
+        self.entries = entries
+        self.words = {}
+        self.weights = {}
+        self.titles = {}
+        self.authors = {}
+        self.dois = {}
+
+        if skip is None:
+            skip = set()
+
+        titles = {}
+        for id_, entry in enumerate(entries):
+            if entry['ID'] in skip:
+                continue
+            if 'doi' in entry:
+                self.dois[normalize_doi(entry['doi'])] = id_
+            if 'title' in entry:
+                title = bib.normalize_text(entry['title']).split()
+                words = set(title)
+                if len(words) > 0:
+                    titles[id_] = words
+                    self.titles[id_] = title
+                    for word in words:
+                        self.words.setdefault(word, []).append(id_)
+            if 'author' in entry:
+                self.authors[id_] = bib.author_last_names(entry['author'])[:1]
+
+        #rare words identify a title better than common ones
+        num = max(len(titles), 1)
+        self.idf = {
+            word: math.log(1 + num/len(ids))
+            for word, ids in self.words.items()
+        }
+        for id_, words in titles.items():
+            self.weights[id_] = sum(self.idf[word] for word in words)
+
+    def match(self, front, num=3):
+        '''Rank library entries by how well they match the front page of a document.
+
+        Returns a list of (score, entry position, DOI match) with scores in
+        [0, 1], a DOI match gives a score of 1, otherwise the score is the
+        best sequence ratio between the title and a run of one to
+        `TITLE_LINES` consecutive front page lines, so a title only found
+        inside a longer line of the abstract scores low. Equal scores are
+        ranked by whether the first author is on the front page.
+        '''
+        for doi in front['dois']:
+            if doi in self.dois:
+                return [(1.0, self.dois[doi], True)]
+
+        lines = [bib.normalize_text(line).split() for line in front['lines'][:FRONT_LINES]]
+        text_words = set()
+        for words in lines:
+            text_words.update(words)
+
+        runs = []
+        for start in range(len(lines)):
+            run = []
+            for words in lines[start:(start + TITLE_LINES)]:
+                run = run + words
+                if len(run) > 0:
+                    runs.append(run)
+
+        #only the titles sharing the most rare words with the page are compared line by line
+        coverage = {}
+        for word in text_words:
+            for id_ in self.words.get(word, []):
+                coverage[id_] = coverage.get(id_, 0.0) + self.idf[word]
+        candidates = sorted(coverage, key=lambda id_: (-coverage[id_]/self.weights[id_], id_))
+
+        ranked = []
+        for id_ in candidates[:CANDIDATES]:
+            matcher = difflib.SequenceMatcher(autojunk=False)
+            matcher.set_seq2(self.titles[id_])
+            score = 0.0
+            for run in runs:
+                matcher.set_seq1(run)
+                if matcher.real_quick_ratio() <= score or matcher.quick_ratio() <= score:
+                    continue
+                score = max(score, matcher.ratio())
+            authors = self.authors.get(id_, [])
+            author = len(authors) > 0 and all(name in text_words for name in authors[0].split())
+            ranked.append((score, author, id_))
+
+        ranked.sort(key=lambda x: (-x[0], not x[1], x[2]))
+        return [(score, id_, False) for score, _, id_ in ranked[:num]]
+
+
+def match_documents(index, fronts, threshold):
+    '''Best match per document above `threshold`, an entry is only proposed for its best matching document.
+
+    DOI matches are preferred over title matches of the same entry.
+    Returns a list of (document position, score, entry position, DOI match) ordered by score.
+    '''
+    best = {}
+    for doc_id, front in enumerate(fronts):
+        for score, id_, doi in index.match(front, num=1):
+            if score < threshold:
+                continue
+            if id_ not in best or best[id_][0] < (doi, score):
+                best[id_] = ((doi, score), (doc_id, score, id_, doi))
+    ranked = sorted(best.values(), key=lambda x: x[0], reverse=True)
+    return [match for _, match in ranked]
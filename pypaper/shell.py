@@ -1,11 +1,13 @@
 
 #Python standard
 from cmd import Cmd
+from functools import reduce
 from glob import glob
 import os
 import pathlib
 import subprocess
 import re
+import operator
 import string
 
 #Third party
@@ -15,6 +17,18 @@ import inquirer
 #Local
 from . import config
 from . import bib
+from . import tags
+from . import dedup
+from . import cursor
+from . import store
+from . import match
+from . import export
+from . import watch
+from . import graph
+from . import columns
+from . import sync
+from . import integrity
+from .trie import Trie
 
 try:
     import readline
@@ -32,6 +46,13 @@ except Exception:
     ads = None
 
 
+COMPLETION_LIMIT = 500
+BULK_OPERATIONS = ['tag', 'rm', 'set', 'clip', 'export', 'pdf']
+BIB_OPTIONS = ['--limit', '--offset', '--tag', '--fold', '--exact']
+
+_PREDICATE_OP = re.compile(r'[<>]=?|=')
+
+
 def doc_index_arg_check(func):
     def checked_func(self, args):
         if self.new_links is None:
@@ -70,7 +91,7 @@ def doc_index_arg_check(func):
 
 
 def bib_index_arg_check(func):
-    def checked_func(self, args):
+    def checked_func(self, args, *extra):
         if self.bibtex is None:
             print('No bibtex loaded')
             return
@@ -94,17 +115,54 @@ def bib_index_arg_check(func):
                 print('No bibtex entry chosen')
                 return
             else:
-                args = str(opts_.index(answer))
+                args = str(self.current_bibtex.offset + opts_.index(answer))
 
-        elif not args.strip().isnumeric():
-            print('No valid document index given')
+        elif not args.strip().isnumeric() and args.strip() not in self.id_index:
+            print('No valid index or bibtex ID given')
             return
 
-        return func(self, args)
+        return func(self, args, *extra)
     checked_func.__doc__ = func.__doc__
     return checked_func
 
 
+def _pop_option(args, name):
+    '''Remove a "--name value" option from the argument string, the value may be quoted'''
+    find_opt = args.find(name + ' ')
+    if find_opt == -1:
+        return None, args
+
+    start = find_opt + len(name) + 1
+    if start < len(args) and args[start] in ['"', "'"]:
+        find_space = args.find(args[start], start+1)
+        if find_space == -1:
+            raise Exception(f'No closing quotation mark on {name} value')
+        value = args[(start+1):find_space]
+        find_space += 1
+    else:
+        find_space = args.find(' ', start)
+        if find_space == -1:
+            find_space = len(args)
+        value = args[start:find_space]
+
+    return value, args[:find_opt] + args[find_space:]
+
+
+def _pop_flag(args, name):
+    '''Remove a "--name" flag from the argument string, returns if it was given'''
+    match = re.search(r'(^|\s)' + re.escape(name) + r'(?=\s|$)', args)
+    if match is None:
+        return False, args
+    return True, args[:match.start()] + args[match.end():]
+
+
+def _complete_part(text, part, words):
+    '''Completions of `text` from words completing `part`, where either may be the end of the other'''
+    prefix = text[:max(0, len(text) - len(part))]
+    start = max(0, len(part) - len(text))
+    return [prefix + word[start:] for word in words]
+
+
 def open_viewer(path):
     subprocess.Popen(
         [config.config['General']['viewer'], str(path)],
@@ -117,6 +175,7 @@ class Shell(Cmd):
 
     @bib_index_arg_check
     def do_tag(self, args):
+        '''Add or remove (prefix with "-") comma separated tags on a bibtex entry'''
         id_ = self._get_bibid(args)
         if id_ is None:
             print('Index out of range')
@@ -127,25 +186,39 @@ class Shell(Cmd):
         ]
         answers = inquirer.prompt(questions)
 
-        tags = answers['tags'].split(',')
-        tags = [tag.strip() for tag in tags]
-        rem_tags = [tag[1:] for tag in tags if tag[0] == '-']
-        tags = [tag for tag in tags if tag[0] != '-' and len(tag) > 0]
+        new_tags = [tag.strip() for tag in answers['tags'].split(',')]
+        new_tags = [tag for tag in new_tags if len(tag) > 0]
+        rem_tags = [tag[1:] for tag in new_tags if tag[0] == '-']
+        add_tags = [tag for tag in new_tags if tag[0] != '-']
 
-        if 'tags' in self.bibtex.entries[id_]:
-            current_tags = self.bibtex.entries[id_]['tags'].split(',')
+        entry = self.bibtex.entries[id_]
+        if 'tags' in entry:
+            current_tags = tags.split_tags(entry['tags'])
         else:
             current_tags = []
 
-        current_tags = [tag for tag in current_tags if tag not in rem_tags]
-        current_tags += [tag for tag in tags if tag not in current_tags]
-        current_tags = set(current_tags)
-
-        self.bibtex.entries[id_]['tags'] = ','.join(current_tags)
+        self.tag_index.remove(id_, entry)
+        current_tags = tags.update_tags(current_tags, add_tags, rem_tags)
+        if len(current_tags) > 0:
+            entry['tags'] = tags.join_tags(current_tags)
+        elif 'tags' in entry:
+            del entry['tags']
+        self.tag_index.add(id_, entry)
+        self.folded.update(id_, entry)
 
         self.do_save('')
 
 
+    def do_tags(self, args):
+        '''Lists all tags in the database and the number of entries carrying them'''
+        counts = self.tag_index.counts()
+        if len(counts) == 0:
+            print('No tags in database')
+            return
+        for tag, num in counts:
+            print(f'{num:<6}{tag}')
+
+
     def do_docpickup(self, args):
         '''pdf files to add to database'''
         docs = glob(str(config.PICKUP_FOLDER / '*.pdf'))
@@ -154,6 +227,60 @@ class Shell(Cmd):
         self.new_links = docs
 
 
+    def _merge_bibtex(self, b):
+        '''Add the non-duplicate entries and new strings of a picked up bibtex database'''
+        _skip = 0
+        _add = 0
+        bib.rename_bibtex(b)
+
+        fuzzy_index = None
+        if int(config.config['Dedup']['pickup check']):
+            fuzzy_index, fuzzy_cache = dedup.build_index(self.bibtex.entries)
+            fuzzy_threshold = float(config.config['Dedup']['threshold'])
+
+        #add non-duplicates
+        for in_entry in b.entries:
+            _exists = False
+            if 'title' not in in_entry:
+                continue
+
+            for entry in self.bibtex.entries:
+                if in_entry['ID'] == entry['ID']:
+                    _exists = True
+                if str(in_entry['title']) == str(entry['title']):
+                    _exists = True
+
+            if not _exists and fuzzy_index is not None:
+                sig = fuzzy_cache.get(in_entry)
+                if sig is not None:
+                    matches = fuzzy_index.query(sig, fuzzy_threshold)
+                    if len(matches) > 0:
+                        _exists = True
+                        print(f'{in_entry["ID"]} is a possible duplicate of {self.bibtex.entries[matches[0][1]]["ID"]}')
+
+            if not _exists:
+                self._append_entry(in_entry)
+                _add += 1
+            else:
+                _skip += 1
+        if _skip > 0:
+            print('Skipped {} duplicates'.format(_skip))
+        if fuzzy_index is not None:
+            fuzzy_cache.save()
+
+        _add_str = 0
+        for key in b.strings:
+            if key not in self.bibtex.strings:
+                self.bibtex.strings[key] = b.strings[key]
+                _add_str += 1
+
+        if _add > 0:
+            self._reset_cursor()
+
+        print('Added {} entries'.format(_add))
+        print('Added {}/{} strings'.format(_add_str, len(b.strings) - len(bibtexparser.bibdatabase.COMMON_STRINGS)))
+
+
     def do_pickup(self, args):
         '''Pickup bibtex files and pdf files to add to database'''
 
@@ -166,37 +293,7 @@ class Shell(Cmd):
             print('Picking up from "{}"'.format(b_path))
         if len(bibs) > 0:
             b = bib.load_bibtex(bibs)
-            _skip = 0
-            _add = 0        
-            bib.rename_bibtex(b)
-            #add non-duplicates
-            for in_entry in b.entries:
-                _exists = False
-                if 'title' not in in_entry:
-                    continue
-
-                for entry in self.bibtex.entries:
-                    if in_entry['ID'] == entry['ID']:
-                        _exists = True
-                    if str(in_entry['title']) == str(entry['title']):
-                        _exists = True
-
-                if not _exists:
-                    self.bibtex.entries.append(in_entry)
-                    _add += 1
-                else:
-                    _skip += 1
-            if _skip > 0:
-                print('Skipped {} duplicates'.format(_skip))
-
-            _add_str = 0
-            for key in b.strings:
-                if key not in self.bibtex.strings:
-                    self.bibtex.strings[key] = b.strings[key]
-                    _add_str += 1
-
-            print('Added {} entries'.format(_add))
-            print('Added {}/{} strings'.format(_add_str, len(b.strings) - len(bibtexparser.bibdatabase.COMMON_STRINGS)))
+            self._merge_bibtex(b)
             for b_path in bibs:
                 os.rename(b_path, config.TRASH_FOLDER / b_path.name)
 
@@ -206,9 +303,127 @@ class Shell(Cmd):
             self.do_save('')
 
 
+    def do_dedup(self, args):
+        '''Find clusters of likely duplicate bibtex entries and merge them'''
+        clusters = dedup.find_duplicates(self.bibtex.entries)
+        if len(clusters) == 0:
+            print('No duplicates found')
+            return
+        print(f'{len(clusters)} clusters of possible duplicates found')
+
+        remove = set()
+        for cluster in clusters:
+            opts_ = []
+            for cid_ in cluster:
+                entry = self.bibtex.entries[cid_]
+                opts_.append(f'{entry["ID"]} ({entry["ENTRYTYPE"]}, {entry.get("year", "yyyy")})')
+
+            questions = [
+                inquirer.List('keep',
+                    message='Merge into which entry?',
+                    choices=opts_ + ['SKIP', 'STOP'],
+                    carousel=True,
+                ),
+            ]
+            answers = inquirer.prompt(questions)
+            answer = answers['keep']
+            if answer == 'STOP':
+                break
+            elif answer == 'SKIP':
+                continue
+
+            keep_id = cluster[opts_.index(answer)]
+            keep = self.bibtex.entries[keep_id]
+            for cid_ in cluster:
+                if cid_ == keep_id:
+                    continue
+                entry = self.bibtex.entries[cid_]
+                bib.merge_entries(keep, entry)
+                if keep['ID'] in self.store:
+                    self.store.remove(entry['ID'])
+                else:
+                    self.store.rename(entry['ID'], keep['ID'])
+                remove.add(cid_)
+
+        if len(remove) == 0:
+            return
+
+        self.bibtex.entries = [
+            entry for id_, entry in enumerate(self.bibtex.entries)
+            if id_ not in remove
+        ]
+        self._reindex()
+        self._reset_cursor()
+        print(f'Merged {len(remove)} duplicate entries')
+
+        self.do_save('')
+
+
+    def start_watcher(self):
+        '''Watch the pickup and paper folders in the background'''
+        self.watcher = watch.FolderWatcher(
+            [config.PICKUP_FOLDER, config.PAPERS_FOLDER],
+            interval=float(config.config['General']['watch interval']),
+        )
+        #the watches are in place once started so nothing is missed between them and the scan
+        self.watcher.start()
+        self.do_docpickup('')
+
+    def _apply_watch_events(self):
+        if self.watcher is None:
+            return
+        save_ = False
+        for kind, path, data in self.watcher.pending():
+            if kind == 'rescan':
+                #events were lost, the files still there are reported again after this
+                if path == config.PICKUP_FOLDER:
+                    self.new_links = [link for link in self.new_links if link.exists()]
+                continue
+            if path.parent == config.PICKUP_FOLDER:
+                if path.suffix == '.pdf':
+                    if kind == 'created' and path.exists() and path not in self.new_links:
+                        self.new_links.append(path)
+                        print(f'Picked up "{path.name}"')
+                    elif kind == 'removed' and path in self.new_links:
+                        self.new_links.remove(path)
+                elif path.suffix == '.bib' and kind == 'created' and data is not None:
+                    if int(config.config['General']['auto merge']) and path.exists():
+                        print(f'Picking up from "{path}"')
+                        self._merge_bibtex(data)
+                        os.rename(path, config.TRASH_FOLDER / path.name)
+                        save_ = True
+                    else:
+                        print(f'New bibtex file "{path.name}" in pickup')
+            elif path.parent == config.PAPERS_FOLDER and path.suffix == '.pdf':
+                bib_id = path.stem
+                if kind == 'created' and path.exists() and bib_id not in self.store:
+                    self.store.add(path, bib_id)
+                    print(f'{config.Terminal.GREEN + bib_id + config.Terminal.END} added to paper database')
+                elif kind == 'removed' and bib_id in self.store and not path.exists():
+                    self.store.remove(bib_id)
+                    print(f'{bib_id} removed from paper database')
+        if save_:
+            self.do_save('')
+
+    def precmd(self, line):
+        self._apply_watch_events()
+        return line
+
+
     def do_save(self, args):
-        '''Save bibtex file'''
-        bib.save_bibtex(config.BIB_FILE, self.bibtex)
+        '''Save bibtex file, changes made to it by other pypaper processes are merged first'''
+        with sync.FileLock(config.LOCK_FILE):
+            if self.snapshot.changed(config.BIB_FILE):
+                bib_data, _ = sync.read_file(config.BIB_FILE)
+                updated, added, removed, conflicts = self.snapshot.merge(bib_data, self.bibtex)
+                print(f'Bibtex file changed on disk: merged {updated} updated, {added} added and {removed} removed entries')
+                for bib_id in conflicts:
+                    print(f'{config.Terminal.RED}Conflicting changes{config.Terminal.END}: kept local version of {bib_id}')
+                self._reindex()
+                self._reset_cursor()
+
+            bib_data = bib.save_bibtex(config.BIB_FILE, self.bibtex, self.writer)
+            self.snapshot.record(sync.file_state(config.BIB_FILE), bib_data, self.bibtex)
 
 
     @bib_index_arg_check
@@ -219,6 +434,8 @@ class Shell(Cmd):
             print('Index out of range')
             return
         del self.bibtex.entries[id_]
+        self._reindex()
+        self._reset_cursor()
         self.do_save('')
 
     @bib_index_arg_check
@@ -266,30 +483,263 @@ class Shell(Cmd):
         print('Copied bibtex entry to clipboard')
 
 
+    def do_bulk(self, args):
+        '''Apply an operation to all entries in the current bibtex list with a single save, syntax: tag [tags] | rm | set [field]=[value] | clip | export [bib file] | pdf'''
+        if self.bibtex is None or self.current_bibtex is None:
+            print('No bibtex loaded')
+            return
+
+        args = args.strip().split(' ', 1)
+        operation = args[0]
+        args = args[1].strip() if len(args) > 1 else ''
+        if operation not in BULK_OPERATIONS:
+            print(f'Unknown bulk operation "{operation}", choose from: {", ".join(BULK_OPERATIONS)}')
+            return
+
+        ids = self.current_bibtex.all()
+        if len(ids) == 0:
+            print('No entries in current list')
+            return
+
+        getattr(self, f'_bulk_{operation}')(ids, args)
+
+    def _bulk_tag(self, ids, args):
+        if len(args) == 0:
+            questions = [
+                inquirer.Text('tags', message=f'Enter tags for {len(ids)} entries'),
+            ]
+            answers = inquirer.prompt(questions)
+            if answers is None:
+                return
+            args = answers['tags']
+
+        new_tags = [tag.strip() for tag in args.split(',')]
+        new_tags = [tag for tag in new_tags if len(tag) > 0]
+        rem_tags = [tag[1:] for tag in new_tags if tag[0] == '-']
+        add_tags = [tag for tag in new_tags if tag[0] != '-']
+        if len(new_tags) == 0:
+            print('No tags given')
+            return
+
+        changes = [f'add {", ".join(add_tags)}'] if len(add_tags) > 0 else []
+        if len(rem_tags) > 0:
+            changes.append(f'remove {", ".join(rem_tags)}')
+        questions = [
+            inquirer.Confirm('tag', message=f'{" and ".join(changes).capitalize()} tags on {len(ids)} bibtex entries?', default=False),
+        ]
+        answers = inquirer.prompt(questions)
+        if answers is None or not answers['tag']:
+            print('Nothing changed')
+            return
+
+        changed = 0
+        for id_ in ids:
+            entry = self.bibtex.entries[id_]
+            current_tags = tags.split_tags(entry.get('tags', ''))
+            updated_tags = tags.update_tags(current_tags, add_tags, rem_tags)
+            if updated_tags == current_tags:
+                continue
+            self.tag_index.remove(id_, entry)
+            if len(updated_tags) > 0:
+                entry['tags'] = tags.join_tags(updated_tags)
+            else:
+                del entry['tags']
+            self.tag_index.add(id_, entry)
+            self.folded.update(id_, entry)
+            changed += 1
+
+        print(f'Tags changed on {changed}/{len(ids)} entries')
+        if changed > 0:
+            self.do_save('')
+
+    def _bulk_rm(self, ids, args):
+        questions = [
+            inquirer.Confirm('remove', message=f'Remove {len(ids)} bibtex entries?', default=False),
+        ]
+        answers = inquirer.prompt(questions)
+        if answers is None or not answers['remove']:
+            print('Nothing removed')
+            return
+
+        remove = set(ids)
+        self.bibtex.entries = [
+            entry for id_, entry in enumerate(self.bibtex.entries)
+            if id_ not in remove
+        ]
+        self._reindex()
+        self._reset_cursor()
+        print(f'Removed {len(remove)} entries')
+        self.do_save('')
+
+    def _bulk_set(self, ids, args):
+        if '=' not in args:
+            print('No [field]=[value] given')
+            return
+        key, value = args.split('=', 1)
+        key = key.strip()
+        value = value.strip()
+        if len(value) > 1 and value[0] in ['"', "'"] and value[-1] == value[0]:
+            value = value[1:-1]
+        if len(key) == 0 or key == 'ID':
+            print('Invalid field')
+            return
+
+        if len(value) > 0:
+            message = f'Set {key} to "{value}" on {len(ids)} bibtex entries?'
+        else:
+            message = f'Remove {key} from {len(ids)} bibtex entries?'
+        questions = [
+            inquirer.Confirm('set', message=message, default=False),
+        ]
+        answers = inquirer.prompt(questions)
+        if answers is None or not answers['set']:
+            print('Nothing changed')
+            return
+
+        for id_ in ids:
+            entry = self.bibtex.entries[id_]
+            if len(value) > 0:
+                entry[key] = value
+            elif key in entry:
+                del entry[key]
+        self._reindex()
+        if len(value) > 0:
+            print(f'Set {key} on {len(ids)} entries')
+        else:
+            print(f'Removed {key} from {len(ids)} entries')
+        self.do_save('')
+
+    def _bulk_subset(self, ids):
+        return export.subset_database(
+            self.bibtex,
+            self.id_index,
+            [self.bibtex.entries[id_]['ID'] for id_ in ids],
+        )[0]
+
+    def _bulk_clip(self, ids, args):
+        data = export.dumps_subset(self._bulk_subset(ids))
+        cmd = ['xsel','-b','-i']
+        subprocess.run(cmd, universal_newlines=True, input=data)
+        print(f'Copied {len(ids)} bibtex entries to clipboard')
+
+    def _bulk_export(self, ids, args):
+        if len(args) == 0:
+            print('No bibtex file given')
+            return
+        out = pathlib.Path(args).expanduser()
+        if out.exists():
+            questions = [
+                inquirer.Confirm('overwrite', message=f'Overwrite "{out}"?', default=False),
+            ]
+            answers = inquirer.prompt(questions)
+            if answers is None or not answers['overwrite']:
+                print('Nothing exported')
+                return
+        subset = self._bulk_subset(ids)
+        export.save_subset(out, subset)
+        print(f'Exported {len(subset.entries)} entries to "{out}"')
+
+    def _bulk_pdf(self, ids, args):
+        if ads is None:
+            print('ADS interface import failed')
+            return
+        bibcodes = []
+        bib_ids = []
+        for id_ in ids:
+            entry = self.bibtex.entries[id_]
+            bibcode = graph.entry_bibcode(entry)
+            if bibcode is not None and entry['ID'] not in self.store:
+                bibcodes.append(bibcode)
+                bib_ids.append(entry['ID'])
+        if len(bibcodes) == 0:
+            print('No entries without PDF that have an ADS bibcode')
+            return
+        questions = [
+            inquirer.Confirm('pdf', message=f'Fetch PDFs for {len(bibcodes)} bibtex entries from ADS?', default=False),
+        ]
+        answers = inquirer.prompt(questions)
+        if answers is None or not answers['pdf']:
+            print('Nothing fetched')
+            return
+        self.downloads.append(ads.fetch_PDF_from_ADS(bibcodes, bib_ids, self.store))
+        print(f'Fetching PDFs for {len(bibcodes)} entries in the background')
+
+    def complete_bulk(self, text, line, begidx, endidx):
+        if len(line[:begidx].split()) > 1:
+            return []
+        return [operation for operation in BULK_OPERATIONS if operation.startswith(text)]
+
+
+    def do_export(self, args):
+        '''Write the entries cited in a LaTeX project to a bibtex file, syntax: [project folder or .tex/.aux/.bcf file] --out [bib file]'''
+        out, args = _pop_option(args, '--out')
+        path = pathlib.Path(args.strip() or '.').expanduser()
+
+        files = export.project_files(path)
+        if len(files) == 0:
+            print('No .tex, .aux or .bcf files found')
+            return
+
+        keys = export.collect_citations(files)
+        subset, missing = export.subset_database(self.bibtex, self.id_index, keys)
+
+        for key in dict.fromkeys(missing):
+            print(f'{config.Terminal.RED}Unresolved key{config.Terminal.END}: {key}')
+
+        if out is None:
+            if path.is_dir():
+                out = path / f'{path.resolve().name}.bib'
+            else:
+                out = path.with_suffix('.bib')
+        out = pathlib.Path(out).expanduser()
+        if out.exists():
+            questions = [
+                inquirer.Confirm('overwrite', message=f'Overwrite "{out}"?', default=False),
+            ]
+            answers = inquirer.prompt(questions)
+            if answers is None or not answers['overwrite']:
+                print('Nothing exported')
+                return
+
+        export.save_subset(out, subset)
+        print(f'Exported {len(subset.entries)} entries for {len(keys)} citations to "{out}"')
+
+
     def do_stat(self, args):
         '''Display current statistics'''
         print(f'{len(self.bibtex.entries)} bibtex entries loaded')
-        print(f'{len(self.current_bibtex)} entries in current list')
+        print(f'{self.current_bibtex.found()} entries in current list')
         if self.new_links is not None:
             print(f'{len(self.new_links)} picked up documents to link')
-        if self.docs is not None:
-            print(f'{len(self.docs)} documents in database')
+        print(f'{len(self.store)} documents in database')
 
 
     def do_load(self, args):
         '''Load bibtex file and list of papers'''
-        self.bibtex = bib.load_bibtex(config.BIB_FILE)
+        with sync.FileLock(config.LOCK_FILE, shared=True):
+            bib_data, state = sync.read_file(config.BIB_FILE)
+        self.bibtex = bib.loads_bibtex(bib_data)
 
         self.bibtex.comments = []
 
-        bib.rename_bibtex(self.bibtex)
-        self.current_bibtex = []
+        #seeded before renaming so entries with changed IDs or crossrefs are serialized again
+        self.writer = bib.CachedWriter()
+        self.writer.seed(bib_data, self.bibtex)
+
+        renames = bib.rename_bibtex(self.bibtex)
+        self.snapshot.record(state, bib_data, self.bibtex, renames)
+        self._reindex()
+        self._reset_cursor()
 
         print('Bib load: {} entries loaded'.format(len(self.bibtex.entries)))
-        self.docs = glob(str(config.PAPERS_FOLDER / '*.pdf'))
-        self.docs = [pathlib.Path(p) for p in self.docs]
+        self.store.load()
+        for old_id, new_id in renames.items():
+            self.store.rename(old_id, new_id, save=False)
+        if len(renames) > 0:
+            self.store.save()
 
-        print('DOCS load: {} papers found'.format(len(self.docs)))
+        print('DOCS load: {} papers found'.format(len(self.store)))
+        self.graph.load()
 
 
     def do_doclist(self, args):
@@ -337,33 +787,37 @@ class Shell(Cmd):
 
 
     def do_bib(self, args):
-        '''Lists selected bibtex entries in database, syntax: --limit [int] [field]=[regex] &/| [field]=[regex]...'''
-
-        if len(args) > 0:
-            find_limit = args.find('--limit', 0)
-            if find_limit != -1:
-                find_space = args.find(' ', find_limit+8)
-                if find_space == -1:
-                    self.limit = int(args[(find_limit+8):])
-                    find_space = len(args)
-                else:
-                    self.limit = int(args[(find_limit+8):find_space])
-
-                args = args.replace(args[find_limit:find_space], '')
-
-        tags = []
-        if len(args) > 0:
-            find_limit = args.find('--tag', 0)
-            if find_limit != -1:
-                find_space = args.find(' ', find_limit+6)
-                if find_space == -1:
-                    tags = args[(find_limit+6):].split(',')
-                    find_space = len(args)
-                else:
-                    tags = args[(find_limit+6):find_space].split(',')
+        '''Lists selected bibtex entries in database, syntax: --limit [int] --offset [int] --tag [tag expression] --fold/--exact [field]=[regex] &/| [field]=[regex]...
+
+        Tag expressions combine tags with & (and), | or , (or), ! (not) and parentheses, e.g. --tag "(radar|meteor)&!review"
+        The year can be compared with <, <=, >, >= and ranges, e.g. year>=2015 or year=2015..2020, year=2015 matches exactly and other year= patterns are regexes (year=201 finds 2010-2019), entrytype=article selects by entry type.
+        --fold matches ignoring case, accents, braces and LaTeX escapes (author=Kästinen finds K{\\"a}stinen), --exact matches the raw values, the default is "fold search" in the config.
+        Results are evaluated lazily one page at a time, use next and prev to page through them.
+        '''
+
+        limit, args = _pop_option(args, '--limit')
+        if limit is not None:
+            self.limit = int(limit)
+
+        offset, args = _pop_option(args, '--offset')
+        tag_expr, args = _pop_option(args, '--tag')
+
+        fold = bool(int(config.config['General']['fold search']))
+        fold_flag, args = _pop_flag(args, '--fold')
+        exact_flag, args = _pop_flag(args, '--exact')
+        if fold_flag:
+            fold = True
+        elif exact_flag:
+            fold = False
+
+        tag_ids = None
+        if tag_expr is not None:
+            try:
+                tag_ids = self.tag_index.query(tag_expr, range(len(self.bibtex.entries)))
+            except ValueError as err:
+                print(err)
+                return
 
-                args = args.replace(args[find_limit:find_space], '')
-        
         args = args.strip()
 
         if len(args) > 0:
@@ -373,12 +827,14 @@ class Shell(Cmd):
             find_pos = 0
 
             while True:
-                eq_pos = args.find('=', find_pos)
-                if eq_pos == -1:
+                op_match = _PREDICATE_OP.search(args, find_pos)
+                if op_match is None:
                     break
-                key = args[find_pos:eq_pos].strip()
+                key = args[find_pos:op_match.start()].strip()
+                op = op_match.group()
+                eq_pos = op_match.end() - 1
                 if eq_pos+1 >= len(args):
-                    arg_list.append([len(arg_list), key, ''])
+                    arg_list.append([len(arg_list), key, op, ''])
                     break
 
                 if args[eq_pos+1] in ['"', "'"]:
@@ -393,7 +849,7 @@ class Shell(Cmd):
                         find_pos = len(args)
                     pattern = args[(eq_pos+1):find_pos]
 
-                arg_list.append([len(arg_list), key, pattern])
+                arg_list.append([len(arg_list), key, op, pattern])
 
                 if find_pos+1 >= len(args):
                     break
@@ -401,96 +857,218 @@ class Shell(Cmd):
                     operators.append(args[find_pos+1])
                     find_pos += 3
 
-            self.current_bibtex = []
-            for id_,entry in enumerate(self.bibtex.entries):
-                add_ = None
-                for arg_id, key, pattern in arg_list:
-                    if key in entry:
-                        resh = re.search(pattern, str(entry[key]))
-                        if add_ is None:
-                            add_ = resh is not None
-                        else:
-                            operator = operators[arg_id-1]
-                            if operator == '&':
-                                add_ = add_ and resh is not None
-                            elif operator == '|':
-                                add_ = add_ or resh is not None
-                if add_ is None:
-                    add_ = False
-                
-                if len(tags) > 0:
-                    if 'tags' in entry:
-                        tag_ex_ = False
-                        etags = entry['tags'].split(',')
-                        for tag in tags:
-                            if tag in etags:
-                                tag_ex_ = True
-                                break
-                        add_ = add_ and tag_ex_
-                    else:
-                        add_ = False
-
-                if add_:
-                    self.current_bibtex.append(id_)
+            column_maps = {}
+            for arg_id, key, op, pattern in arg_list:
+                bitmap = self.columns.select(key, op, pattern)
+                if bitmap is not None:
+                    column_maps[arg_id] = bitmap
+                elif op != '=':
+                    print(f'No numeric comparison possible for "{key}{op}{pattern}"')
+                    return
+
+            self.current_bibtex = cursor.ResultCursor(
+                self._search(arg_list, operators, tag_ids, column_maps, fold)
+            )
+        elif tag_ids is not None:
+            self.current_bibtex = cursor.ResultCursor(sorted(tag_ids))
+
+        if offset is not None:
+            self.current_bibtex.offset = int(offset)
+        elif len(args) > 0 or tag_ids is not None:
+            self.current_bibtex.offset = 0
 
-            if len(self.current_bibtex) == 0:
+        strs_ = self._list_bib()
+        if len(strs_) == 0:
+            if self.current_bibtex.offset == 0:
                 print('No matches')
-                return
-        else:
-            if len(tags) > 0:
-                self.current_bibtex = []
-                for id_,entry in enumerate(self.bibtex.entries):
-                    tag_ex_ = False
-                    if 'tags' in entry:
-                        etags = entry['tags'].split(',')
-                        for tag in tags:
-                            if tag in etags:
-                                tag_ex_ = True
-                                break
-                    if tag_ex_:
-                        self.current_bibtex.append(id_)
+                self._reset_cursor()
+            else:
+                print('No entries at this offset')
+            return
 
-        strs_ = self._list_bib()
         for str_ in strs_:
             print(str_)
 
 
-    def _list_bib(self):
-        if len(self.current_bibtex) == 0:
-            if len(self.bibtex.entries) > self.limit:
-                display_bibtex = list(range(self.limit))
-            else:
-                display_bibtex = list(range(len(self.bibtex.entries)))
+    def _search(self, arg_list, operators, tag_ids, column_maps, fold=False):
+        '''Generate positions of entries matching the field patterns.
+
+        Predicates served by the column index are combined as bitmaps, regex
+        patterns are only checked on the remaining candidates. With `fold`
+        the patterns are matched against the folded shadow columns.
+        '''
+        entries = self.bibtex.entries
+        conjunctive = all(op == '&' for op in operators)
+
+        if len(arg_list) > 0 and len(column_maps) == len(arg_list):
+            bitmap = column_maps[0]
+            for arg_id in range(1, len(arg_list)):
+                if operators[arg_id-1] == '&':
+                    bitmap &= column_maps[arg_id]
+                else:
+                    bitmap |= column_maps[arg_id]
+            for id_ in columns.positions(bitmap):
+                if tag_ids is None or id_ in tag_ids:
+                    yield id_
+            return
+
+        if conjunctive and len(column_maps) > 0:
+            candidates = columns.positions(reduce(operator.and_, column_maps.values()))
+            if tag_ids is not None:
+                candidates = [id_ for id_ in candidates if id_ in tag_ids]
+            column_sets = None
         else:
-            if len(self.current_bibtex) > self.limit:
-                display_bibtex = self.current_bibtex[:self.limit]
+            if tag_ids is not None:
+                candidates = sorted(tag_ids)
             else:
-                display_bibtex = self.current_bibtex
+                candidates = range(len(entries))
+            column_sets = {
+                arg_id: set(columns.positions(bitmap))
+                for arg_id, bitmap in column_maps.items()
+            }
+
+        if fold:
+            folded = {
+                arg_id: (self.folded.get(key), re.compile(bib.strip_accents(pattern), re.IGNORECASE))
+                for arg_id, key, op, pattern in arg_list
+                if arg_id not in column_maps
+            }
+
+        for id_ in candidates:
+            entry = entries[id_]
+            add_ = None
+            for arg_id, key, op, pattern in arg_list:
+                if arg_id in column_maps:
+                    #candidates already satisfy all column predicates of a conjunction
+                    resh = column_sets is None or id_ in column_sets[arg_id]
+                elif fold:
+                    column, regex = folded[arg_id]
+                    if column[id_] is None:
+                        continue
+                    resh = regex.search(column[id_]) is not None
+                elif key in entry:
+                    resh = re.search(pattern, str(entry[key])) is not None
+                else:
+                    continue
+                if add_ is None:
+                    add_ = resh
+                else:
+                    if operators[arg_id-1] == '&':
+                        add_ = add_ and resh
+                    elif operators[arg_id-1] == '|':
+                        add_ = add_ or resh
+
+            if add_:
+                yield id_
+
+
+    def do_next(self, args):
+        '''Lists the next page of the current bibtex entry list'''
+        if not self.current_bibtex.has_next(self.limit):
+            print('No more entries')
+            return
+        self.current_bibtex.offset += self.limit
+        for str_ in self._list_bib():
+            print(str_)
 
-        strs_ = [None]*len(display_bibtex)
-        for id_, cid_ in enumerate(display_bibtex):
+
+    def do_prev(self, args):
+        '''Lists the previous page of the current bibtex entry list'''
+        if self.current_bibtex.offset == 0:
+            print('Already at the first page')
+            return
+        self.current_bibtex.offset = max(0, self.current_bibtex.offset - self.limit)
+        for str_ in self._list_bib():
+            print(str_)
+
+
+    def _reindex(self):
+        '''Rebuild all in-memory indices of the bibtex entries'''
+        self.tag_index.build(self.bibtex.entries)
+        self.id_index = {entry['ID']: id_ for id_, entry in enumerate(self.bibtex.entries)}
+        self.id_trie = Trie(self.id_index)
+        self.bibcode_index = {}
+        for id_, entry in enumerate(self.bibtex.entries):
+            bibcode = graph.entry_bibcode(entry)
+            if bibcode is not None:
+                self.bibcode_index[bibcode] = id_
+        self.field_trie = Trie(set(key for entry in self.bibtex.entries for key in entry))
+        self.columns.build(self.bibtex.entries)
+        self.folded.build(self.bibtex.entries)
+
+
+    def _append_entry(self, entry):
+        id_ = len(self.bibtex.entries)
+        self.bibtex.entries.append(entry)
+        self.tag_index.add(id_, entry)
+        self.columns.add(id_, entry)
+        self.folded.add(id_, entry)
+        self.id_index[entry['ID']] = id_
+        self.id_trie.insert(entry['ID'])
+        bibcode = graph.entry_bibcode(entry)
+        if bibcode is not None:
+            self.bibcode_index[bibcode] = id_
+        for key in entry:
+            if key not in self.field_trie:
+                self.field_trie.insert(key)
+
+
+    def _reset_cursor(self):
+        self.current_bibtex = cursor.ResultCursor(range(len(self.bibtex.entries)))
+
+
+    def _list_bib(self):
+        page = self.current_bibtex.page(self.limit)
+
+        strs_ = [None]*len(page)
+        for id_, (lid_, cid_) in enumerate(page):
             entry = self.bibtex.entries[cid_]
-            file_ = '   '
-            for f in self.docs:
-                if f.stem == entry["ID"]:
-                    file_ = 'pdf'
+            if entry['ID'] in self.store:
+                file_ = 'pdf'
+            else:
+                file_ = '   '
 
-            strs_[id_] = f'{id_:<4}[{file_}]: {entry["ID"]}'
+            strs_[id_] = f'{lid_:<4}[{file_}]: {entry["ID"]}'
         return strs_
 
     def _get_bibid(self, args):
-        if len(self.current_bibtex) > 0:
-            if int(args) > len(self.current_bibtex):
-                id_ = None
-            else:
-                id_ = self.current_bibtex[int(args)]
-        else:
-            if int(args) > len(self.bibtex.entries):
-                id_ = None
-            else:
-                id_ = int(args)
+        args = args.strip()
+        if args in self.id_index:
+            return self.id_index[args]
+        try:
+            id_ = self.current_bibtex[int(args)]
+        except IndexError:
+            id_ = None
         return id_
 
+    def _complete_id(self, text, line, begidx, endidx):
+        return self.id_trie.complete(text, limit=COMPLETION_LIMIT)
+
+    complete_tag = _complete_id
+    complete_bibrm = _complete_id
+    complete_bibview = _complete_id
+    complete_bw = _complete_id
+    complete_id = _complete_id
+    complete_clip = _complete_id
+    complete_open = _complete_id
+    complete_link = _complete_id
+    complete_cites = _complete_id
+    complete_citedby = _complete_id
+
+    def complete_bib(self, text, line, begidx, endidx):
+        #readline splits words on "-", "=", "&" and the like so the word is taken from the line
+        word = re.search(r'\S*$', line[:endidx]).group(0)
+        if re.search(r'--tag\s+\S*$', line[:endidx]):
+            part = re.split(r'[&|,!()]', word)[-1]
+            return _complete_part(text, part, self.tag_index.trie.complete(part, limit=COMPLETION_LIMIT))
+        if word.startswith('-'):
+            return _complete_part(text, word, [opt for opt in BIB_OPTIONS if opt.startswith(word)])
+        part = re.split(r'[&|]', word)[-1]
+        if _PREDICATE_OP.search(part):
+            #a pattern is being typed
+            return []
+        return _complete_part(text, part, [key + '=' for key in self.field_trie.complete(part, limit=COMPLETION_LIMIT)])
+
     @bib_index_arg_check
     def do_open(self, args):
         '''Opens paper linked to bibtex entry'''
@@ -499,8 +1077,8 @@ class Shell(Cmd):
             print('Index out of range')
             return
 
-        fname = config.PAPERS_FOLDER / f'{self.bibtex.entries[id_]["ID"]}.pdf'
-        if fname.exists():
+        fname = self.store.resolve(self.bibtex.entries[id_]['ID'])
+        if fname is not None:
             open_viewer(fname)
         else:
             print('No pdf linked to this entry')
@@ -533,13 +1111,67 @@ class Shell(Cmd):
             print('No PDF linked')
             return
         else:
-            new_path = config.PAPERS_FOLDER / f'{self.bibtex.entries[id_]["ID"]}.pdf'
-            os.rename(self.new_links[opts_.index(answer)], new_path)
+            bib_id = self.bibtex.entries[id_]['ID']
+            self.store.add(self.new_links[opts_.index(answer)], bib_id)
             del self.new_links[opts_.index(answer)]
-            print(f'{config.Terminal.GREEN + new_path.name + config.Terminal.END} added to paper database')
-            
-            self.docs = glob(str(config.PAPERS_FOLDER / '*.pdf'))
-            self.docs = [pathlib.Path(p) for p in self.docs]
+            print(f'{config.Terminal.GREEN + bib_id + config.Terminal.END} added to paper database')
+
+    def do_automatch(self, args):
+        '''Match picked up documents to bibtex entries from their first page and link them in bulk, syntax: --threshold [float]'''
+        if doc is None:
+            print('PDF parsing import failed')
+            return
+
+        threshold, args = _pop_option(args, '--threshold')
+        if threshold is None:
+            threshold = 0.7
+        else:
+            threshold = float(threshold)
+
+        self.do_docpickup('')
+        if len(self.new_links) == 0:
+            print('Nothing has been picked up')
+            return
+
+        print(f'Parsing {len(self.new_links)} documents')
+        fronts = doc.parse_front_pages(self.new_links)
+        index = match.LibraryIndex(self.bibtex.entries, skip=set(self.store.ids()))
+        matches = match.match_documents(index, fronts, threshold)
+        if len(matches) == 0:
+            print('No matches found')
+            return
+
+        opts_ = []
+        confident = []
+        for doc_id, score, id_, doi in matches:
+            label = 'DOI' if doi else f'{score:.2f}'
+            opt = f'{self.new_links[doc_id].name} -> {self.bibtex.entries[id_]["ID"]} ({label})'
+            opts_.append(opt)
+            #only the confident matches are linked without a closer look
+            if doi or score >= match.CONFIDENT:
+                confident.append(opt)
+        questions = [
+            inquirer.Checkbox('match',
+                message='Link which documents?',
+                choices=opts_,
+                default=confident,
+            ),
+        ]
+        answers = inquirer.prompt(questions)
+        if answers is None or len(answers['match']) == 0:
+            print('No documents linked')
+            return
+
+        linked = set()
+        for ans in answers['match']:
+            doc_id, score, id_, doi = matches[opts_.index(ans)]
+            self.store.add(self.new_links[doc_id], self.bibtex.entries[id_]['ID'], save=False)
+            linked.add(doc_id)
+        self.store.save()
+
+        self.new_links = [path for doc_id, path in enumerate(self.new_links) if doc_id not in linked]
+        print(f'{config.Terminal.GREEN}{len(linked)}{config.Terminal.END} documents added to paper database')
+
 
     def do_ads(self, args):
         '''Do a search query on the Harvard ADS database and add selected papers to the database. Download PDFs if possible'''
@@ -598,7 +1230,7 @@ class Shell(Cmd):
                     _exists = True
 
             if not _exists:
-                self.bibtex.entries.append(in_entry)
+                self._append_entry(in_entry)
                 _add += 1
             else:
                 _skip += 1
@@ -608,9 +1240,12 @@ class Shell(Cmd):
 
         self.do_save('')
 
-        ads.get_PDF_from_ADS(bibcodes, [entry['ID'] for entry in bib_database.entries])
-
-        self.do_load('')
+        self.downloads.append(ads.fetch_PDF_from_ADS(
+            bibcodes,
+            [entry['ID'] for entry in bib_database.entries],
+            self.store,
+        ))
+        print(f'Fetching PDFs for {len(bibcodes)} entries in the background')
 
 
     def do_adsfill(self, args):
@@ -619,34 +1254,150 @@ class Shell(Cmd):
         bib_ids = []
 
         for entry in self.bibtex.entries:
-            if 'adsurl' in entry:
-                bibcode = entry['adsurl'].split('/')[-1]
-                bibcode = bibcode.replace('}','')
-
+            bibcode = graph.entry_bibcode(entry)
+            if bibcode is not None:
                 bibcodes.append(bibcode)
                 bib_ids.append(entry['ID'])
 
-        ads.get_PDF_from_ADS(bibcodes, bib_ids)
-        self.do_load('')
+        self.downloads.append(ads.fetch_PDF_from_ADS(bibcodes, bib_ids, self.store))
+        print(f'Fetching PDFs for {len(bibcodes)} entries in the background')
+
+    def do_graphupdate(self, args):
+        '''Fetch references and citations from ADS for entries not yet in the citation graph, syntax: --all to refetch all entries'''
+        if ads is None:
+            print('ADS interface import failed')
+            return
+
+        refetch = '--all' in args.split()
+        bibcodes = [
+            bibcode for bibcode in self.bibcode_index
+            if refetch or bibcode not in self.graph
+        ]
+        if len(bibcodes) == 0:
+            print('Citation graph is up to date')
+            return
+
+        print(f'Fetching citations of {len(bibcodes)} entries from ADS')
+        edges = ads.get_citations_from_ADS(bibcodes)
+        for bibcode, (references, citations) in edges.items():
+            self.graph.set_edges(bibcode, references, citations)
+        self.graph.save()
+
+        if len(edges) < len(bibcodes):
+            print(f'{config.Terminal.RED}{len(bibcodes) - len(edges)} bibcodes not found in ADS{config.Terminal.END}')
+        print(f'Citation graph: {len(self.graph.fetched)} entries fetched, {len(self.graph.bibcodes)} papers known')
+
+    def do_cites(self, args):
+        '''Lists the entries in the database cited by a bibtex entry, syntax: [index] --hops [int]'''
+        hops, args = _pop_option(args, '--hops')
+        self._list_citations(args.strip(), 'references', int(hops or 1))
+
+    def do_citedby(self, args):
+        '''Lists the entries in the database citing a bibtex entry, syntax: [index] --hops [int]'''
+        hops, args = _pop_option(args, '--hops')
+        self._list_citations(args.strip(), 'citations', int(hops or 1))
+
+    @bib_index_arg_check
+    def _list_citations(self, args, direction, hops):
+        id_ = self._get_bibid(args)
+        if id_ is None:
+            print('Index out of range')
+            return
+
+        bibcode = graph.entry_bibcode(self.bibtex.entries[id_])
+        if bibcode is None:
+            print('Entry has no ADS bibcode')
+            return
+        if bibcode not in self.graph:
+            print('Citations of this entry have not been fetched, run graphupdate')
+            return
+
+        bibcodes = self.graph.neighbours(bibcode, direction=direction, hops=hops)
+        ids = [self.bibcode_index[x] for x in bibcodes if x in self.bibcode_index]
+        print(f'{len(ids)} of {len(bibcodes)} papers in database')
+        if len(ids) == 0:
+            return
+
+        self.current_bibtex = cursor.ResultCursor(ids)
+        for str_ in self._list_bib():
+            print(str_)
 
     def setup(self):
         self.bibtex = None
-        self.docs = None
+        self.snapshot = sync.Snapshot()
+        self.writer = bib.CachedWriter()
+        self.store = store.PaperStore()
+        self.downloads = []
+        self.watcher = None
         self.new_links = None
         self.current_bibtex = None
+        self.tag_index = tags.TagIndex()
+        self.id_index = {}
+        self.id_trie = Trie()
+        self.field_trie = Trie()
+        self.graph = graph.CitationGraph()
+        self.columns = columns.ColumnIndex()
+        self.folded = columns.FoldedColumns()
+        self.bibcode_index = {}
         self.limit = 20
         self.do_docpickup('')
 
+    def do_verify(self, args):
+        '''Find corrupt and orphaned PDFs and entries with missing PDFs, syntax: --deep to also open each PDF with pdfminer, --hash to check the content hashes of stored PDFs'''
+        deep, args = _pop_flag(args, '--deep')
+        check_hashes, args = _pop_flag(args, '--hash')
+        if deep and integrity.PDFParser is None:
+            print('PDF parsing import failed, skipping deep check')
+            deep = False
+
+        results, checked = integrity.scan(config.PAPERS_FOLDER, deep=deep)
+
+        corrupt = sorted((name, problem) for name, problem in results.items() if problem is not None)
+        for name, problem in corrupt:
+            print(f'{config.Terminal.RED}Corrupt{config.Terminal.END} ({problem}): {name}')
+
+        orphans = sorted(name for name in results if name[:-4] not in self.id_index)
+        for name in orphans:
+            print(f'{config.Terminal.YELLOW}Orphan{config.Terminal.END}: {name} matches no bibtex ID')
+
+        missing = sorted(
+            bib_id for bib_id in self.store.ids()
+            if bib_id in self.id_index and self.store.resolve(bib_id) is None
+        )
+        for bib_id in missing:
+            print(f'{config.Terminal.RED}Missing PDF{config.Terminal.END}: {bib_id}')
+
+        print(f'{len(results)} PDFs scanned ({checked} checked, {len(results) - checked} unchanged since last scan): {len(corrupt)} corrupt, {len(orphans)} orphans, {len(missing)} missing')
+
+        if check_hashes:
+            problems = self.store.verify()
+            for bib_id, problem in problems:
+                print(f'{config.Terminal.RED + problem + config.Terminal.END}: {bib_id}')
+            print(f'{len(self.store) - len(problems)}/{len(self.store)} stored PDFs verified')
+
+    def _wait_downloads(self):
+        pending = [future for future in self.downloads if not future.done()]
+        if len(pending) > 0:
+            print(f'Waiting for {len(pending)} background PDF fetches to finish')
+            for future in pending:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        self.downloads = []
+
     def do_exit(self, args):
         '''Quits the program.'''
         print('Quitting and saving')
         self.do_save('')
+        self._wait_downloads()
         raise SystemExit
 
     def do_quit(self, args):
         '''Quits the program.'''
         print('Quitting and saving')
         self.do_save('')
+        self._wait_downloads()
         raise SystemExit
 
 
@@ -657,6 +1408,8 @@ def run():
     prompt.prompt = '> '
     prompt.setup()
     prompt.do_load('')
+    if int(config.config['General']['watch']):
+        prompt.start_watcher()
 
     try:
         prompt.cmdloop('Starting prompt...')
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+
+
+def hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class PaperStore:
+    '''Content-addressed PDF storage.
+
+    Each distinct PDF is stored once in the BLOBS folder named by its sha256
+    hash, a manifest maps bibtex IDs to hashes and the ID named files in the
+    PAPERS folder are hard links to the blobs so they keep working with
+    external tools.
+    '''
+
+    def __init__(self):
+        self.papers = {}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.papers)
+
+    def __contains__(self, bib_id):
+        return bib_id in self.papers
+
+    def ids(self):
+        '''Snapshot of the bibtex IDs with a PDF, background downloads may add to the store while it is iterated'''
+        with self.lock:
+            return list(self.papers)
+
+    def load(self):
+        with self.lock:
+            self.papers = {}
+            if config.MANIFEST_FILE.exists():
+                with open(config.MANIFEST_FILE, 'r') as f:
+                    self.papers = json.load(f)['papers']
+
+            # Files placed directly in PAPERS are taken into the store
+            files = [
+                file.name for file in os.scandir(config.PAPERS_FOLDER)
+                if file.name.endswith('.pdf') and file.is_file()
+            ]
+            imported = 0
+            for name in files:
+                bib_id = name[:-4]
+                if bib_id not in self.papers:
+                    self.add(config.PAPERS_FOLDER / name, bib_id, save=False)
+                    imported += 1
+            if imported > 0:
+                print(f'{imported} papers imported into store')
+                self.save()
+
+    def save(self):
+        with self.lock:
+            tmp_file = config.MANIFEST_FILE.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump({'papers': self.papers}, f, indent=1, sort_keys=True)
+            os.replace(tmp_file, config.MANIFEST_FILE)
+
+    def blob_path(self, sha):
+        return config.BLOB_FOLDER / f'{sha}.pdf'
+
+    def paper_path(self, bib_id):
+        return config.PAPERS_FOLDER / f'{bib_id}.pdf'
+
+    def resolve(self, bib_id):
+        '''Path to the PDF of a bibtex entry, None if there is none'''
+        sha = self.papers.get(bib_id)
+        if sha is None:
+            return None
+        path = self.paper_path(bib_id)
+        if path.exists():
+            return path
+        path = self.blob_path(sha)
+        if path.exists():
+            return path
+        return None
+
+    def add(self, path, bib_id, save=True):
+        '''Move a PDF into the store and link it to a bibtex ID, identical files are only kept once'''
+        sha = hash_file(path)
+        blob = self.blob_path(sha)
+        with self.lock:
+            if blob.exists():
+                if not os.path.samefile(path, blob):
+                    os.remove(path)
+            else:
+                os.rename(path, blob)
+
+            old_sha = self.papers.get(bib_id)
+            self.papers[bib_id] = sha
+            self._link(bib_id)
+            if old_sha is not None and old_sha != sha:
+                self._release(old_sha, bib_id)
+            if save:
+                self.save()
+        return blob
+
+    def rename(self, old_id, new_id, save=True):
+        with self.lock:
+            if old_id not in self.papers or old_id == new_id:
+                return
+            if new_id in self.papers:
+                self.remove(old_id, save=save)
+                return
+            self.papers[new_id] = self.papers.pop(old_id)
+            self._unlink(old_id)
+            self._link(new_id)
+            if save:
+                self.save()
+
+    def remove(self, bib_id, save=True):
+        '''Unlink the PDF of a bibtex entry, unreferenced blobs are moved to trash'''
+        with self.lock:
+            sha = self.papers.pop(bib_id, None)
+            if sha is None:
+                return
+            self._unlink(bib_id)
+            self._release(sha, bib_id)
+            if save:
+                self.save()
+
+    def _link(self, bib_id):
+        path = self.paper_path(bib_id)
+        blob = self.blob_path(self.papers[bib_id])
+        if path.exists():
+            if os.path.samefile(path, blob):
+                return
+            os.remove(path)
+        try:
+            os.link(blob, path)
+        except OSError:
+            # No hard link support, the manifest still resolves the blob
+            pass
+
+    def _unlink(self, bib_id):
+        path = self.paper_path(bib_id)
+        if path.exists():
+            os.remove(path)
+
+    def _release(self, sha, bib_id):
+        if sha in self.papers.values():
+            return
+        blob = self.blob_path(sha)
+        if not blob.exists():
+            return
+        #earlier PDFs of the same ID are kept, the hash tells them apart
+        trash = config.TRASH_FOLDER / f'{bib_id}.pdf'
+        if trash.exists():
+            trash = config.TRASH_FOLDER / f'{bib_id}.{sha[:16]}.pdf'
+        if trash.exists():
+            #the same file is already in trash
+            os.remove(blob)
+        else:
+            os.rename(blob, trash)
+
+    def verify(self, workers=None):
+        '''Check the hashes of all blobs in parallel, returns a list of (bib_id, problem)'''
+        with self.lock:
+            papers = dict(self.papers)
+
+        shas = sorted(set(papers.values()))
+
+        def check(sha):
+            blob = self.blob_path(sha)
+            if not blob.exists():
+                return sha, 'missing'
+            if hash_file(blob) != sha:
+                return sha, 'hash mismatch'
+            return sha, None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = dict(executor.map(check, shas))
+
+        problems = []
+        for bib_id, sha in sorted(papers.items()):
+            if results[sha] is not None:
+                problems.append((bib_id, results[sha]))
+        return problems
@@ -0,0 +1,171 @@
+import hashlib
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import bib
+
+
+class FileLock:
+    '''Advisory lock held on a separate lock file.
+
+    The bibtex file itself is replaced on every save so a lock on it would be
+    lost, all pypaper processes instead lock the same lock file. Without
+    `fcntl` the lock does nothing.
+    '''
+
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.shared = shared
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.lockf(self.file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl is not None:
+            fcntl.lockf(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
+
+
+def file_state(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def read_file(path):
+    '''Text of a file and its (size, mtime) at the time of reading'''
+    state = file_state(path)
+    with open(path, 'r') as f:
+        return f.read(), state
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class Snapshot:
+    '''The state of the bibtex file as last loaded or saved by this process.
+
+    Keeps the file size, mtime and hash to detect changes by other
+    processes, a digest of every chunk of the file mapped to the entry ID it
+    holds so only changed chunks have to be parsed, and shallow copies of
+    the entries and strings as they were in the file as the base of the
+    three-way merge.
+    '''
+
+    def __init__(self):
+        self.state = None
+        self.digest = None
+        self.chunks = {}
+        self.entries = {}
+        self.strings = {}
+
+    def record(self, state, bib_data, bib_database, renames=None):
+        '''Take the given file text and database as the new base, `renames` maps IDs in the file to IDs in the database'''
+        if renames is None:
+            renames = {}
+        self.state = state
+        self.digest = _digest(bib_data)
+        self.chunks = {}
+        for chunk in bib.split_chunks(bib_data):
+            id_ = bib.chunk_id(chunk)
+            self.chunks[_digest(chunk.strip())] = renames.get(id_, id_)
+        self.entries = {entry['ID']: dict(entry) for entry in bib_database.entries}
+        self.strings = dict(bib_database.strings)
+
+    def changed(self, path):
+        '''If the file differs from the snapshot, only hashed when the size or mtime changed'''
+        if self.state is None or not path.exists():
+            return False
+        state = file_state(path)
+        if state == self.state:
+            return False
+        with open(path, 'r') as f:
+            if _digest(f.read()) != self.digest:
+                return True
+        self.state = state
+        return False
+
+    def merge(self, bib_data, bib_database):
+        '''Merge the changes between the snapshot and the current file text into the database.
+
+        Entries changed in the file are replaced if they are unchanged in the
+        database, added if they are new and entries removed from the file are
+        removed if unchanged in the database. Entries changed on both sides
+        keep the database version and are returned as conflicts.
+
+        Returns (updated, added, removed, conflicts).
+        '''
+        new_chunks = []
+        current = set()
+        for chunk in bib.split_chunks(bib_data):
+            digest = _digest(chunk.strip())
+            current.add(digest)
+            if digest not in self.chunks:
+                new_chunks.append(chunk)
+
+        #only the changed chunks are parsed
+        remote = bib.loads_bibtex(''.join(new_chunks))
+        bib.rename_bibtex(remote)
+
+        removed_ids = set(
+            id_ for digest, id_ in self.chunks.items()
+            if digest not in current and id_ is not None
+        )
+
+        local = {entry['ID']: id_ for id_, entry in enumerate(bib_database.entries)}
+        updated = 0
+        added = 0
+        conflicts = []
+        for entry in remote.entries:
+            removed_ids.discard(entry['ID'])
+            base = self.entries.get(entry['ID'])
+            if base is not None and dict(entry) == base:
+                #only re-serialized by the other process, no remote change
+                continue
+            if entry['ID'] in local:
+                id_ = local[entry['ID']]
+                mine = dict(bib_database.entries[id_])
+                if mine == dict(entry):
+                    continue
+                if mine == base:
+                    bib_database.entries[id_] = entry
+                    updated += 1
+                else:
+                    conflicts.append(entry['ID'])
+            else:
+                if base is not None:
+                    #removed here but changed in the file, keep the changed entry
+                    conflicts.append(entry['ID'])
+                local[entry['ID']] = len(bib_database.entries)
+                bib_database.entries.append(entry)
+                added += 1
+
+        remove = set()
+        for bib_id in removed_ids:
+            if bib_id not in local:
+                continue
+            id_ = local[bib_id]
+            if dict(bib_database.entries[id_]) == self.entries.get(bib_id):
+                remove.add(id_)
+            else:
+                conflicts.append(bib_id)
+        if len(remove) > 0:
+            bib_database.entries = [
+                entry for id_, entry in enumerate(bib_database.entries)
+                if id_ not in remove
+            ]
+
+        for name, value in remote.strings.items():
+            if name not in bib_database.strings or bib_database.strings[name] == self.strings.get(name):
+                bib_database.strings[name] = value
+
+        return updated, added, len(remove), conflicts
@@ -0,0 +1,129 @@
+import re
+
+from .trie import Trie
+
+
+def split_tags(tag_str):
+    '''Split a comma-joined tag field into an ordered list without duplicates'''
+    tags = []
+    for tag in str(tag_str).split(','):
+        tag = tag.strip()
+        if len(tag) > 0 and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def join_tags(tags):
+    return ','.join(tags)
+
+
+def update_tags(current_tags, add_tags, rem_tags):
+    '''Remove and append tags while keeping the existing order stable'''
+    tags = [tag for tag in current_tags if tag not in rem_tags]
+    tags += [tag for tag in add_tags if tag not in tags]
+    return tags
+
+
+class TagIndex:
+    '''In-memory index mapping each tag to the set of entry positions carrying it'''
+
+    def __init__(self, entries=None):
+        self.index = {}
+        self.trie = Trie()
+        if entries is not None:
+            self.build(entries)
+
+    def build(self, entries):
+        self.index = {}
+        self.trie = Trie()
+        for id_, entry in enumerate(entries):
+            self.add(id_, entry)
+
+    def add(self, id_, entry):
+        if 'tags' not in entry:
+            return
+        for tag in split_tags(entry['tags']):
+            if tag not in self.index:
+                self.index[tag] = set()
+                self.trie.insert(tag)
+            self.index[tag].add(id_)
+
+    def remove(self, id_, entry):
+        if 'tags' not in entry:
+            return
+        for tag in split_tags(entry['tags']):
+            ids = self.index.get(tag)
+            if ids is None:
+                continue
+            ids.discard(id_)
+            if len(ids) == 0:
+                del self.index[tag]
+                self.trie.remove(tag)
+
+    def get(self, tag):
+        return self.index.get(tag, set())
+
+    def all(self):
+        ids = set()
+        for tag_ids in self.index.values():
+            ids |= tag_ids
+        return ids
+
+    def counts(self):
+        return sorted(
+            [(tag, len(ids)) for tag, ids in self.index.items()],
+            key=lambda x: (-x[1], x[0]),
+        )
+
+    def query(self, expr, universe):
+        '''Evaluate a tag expression into a set of entry positions.
+
+        Tags are combined with "&" (and), "|" or "," (or) and "!" (not),
+        parentheses group sub-expressions. "!" is taken relative to `universe`.
+        '''
+        tokens = _tokenize(expr)
+        if len(tokens) == 0:
+            return set()
+        pos, result = self._parse_or(tokens, 0, universe)
+        if pos != len(tokens):
+            raise ValueError(f'Unexpected "{tokens[pos]}" in tag expression')
+        return result
+
+    def _parse_or(self, tokens, pos, universe):
+        pos, result = self._parse_and(tokens, pos, universe)
+        while pos < len(tokens) and tokens[pos] in ('|', ','):
+            pos, rhs = self._parse_and(tokens, pos + 1, universe)
+            result = result | rhs
+        return pos, result
+
+    def _parse_and(self, tokens, pos, universe):
+        pos, result = self._parse_not(tokens, pos, universe)
+        while pos < len(tokens) and tokens[pos] == '&':
+            pos, rhs = self._parse_not(tokens, pos + 1, universe)
+            result = result & rhs
+        return pos, result
+
+    def _parse_not(self, tokens, pos, universe):
+        if pos < len(tokens) and tokens[pos] == '!':
+            pos, result = self._parse_not(tokens, pos + 1, universe)
+            return pos, set(universe) - result
+        return self._parse_atom(tokens, pos, universe)
+
+    def _parse_atom(self, tokens, pos, universe):
+        if pos >= len(tokens):
+            raise ValueError('Incomplete tag expression')
+        token = tokens[pos]
+        if token == '(':
+            pos, result = self._parse_or(tokens, pos + 1, universe)
+            if pos >= len(tokens) or tokens[pos] != ')':
+                raise ValueError('No closing parenthesis in tag expression')
+            return pos + 1, result
+        if token in ('|', ',', '&', ')'):
+            raise ValueError(f'Unexpected "{token}" in tag expression')
+        return pos + 1, set(self.get(token))
+
+
+def _tokenize(expr):
+    tokens = re.findall(r'[&|,!()]|[^&|,!()]+', expr)
+    tokens = [token.strip() for token in tokens]
+    return [token for token in tokens if len(token) > 0]
@@ -0,0 +1,153 @@
+class _Node:
+    __slots__ = ('label', 'children', 'count')
+
+    def __init__(self, label, count=0):
+        self.label = label
+        self.children = {}
+        self.count = count
+
+
+def _common_length(a, b):
+    num = min(len(a), len(b))
+    for i in range(num):
+        if a[i] != b[i]:
+            return i
+    return num
+
+
+class Trie:
+    '''Compressed prefix tree (radix tree) of strings for fast prefix completion.
+
+    Words can be inserted several times and are only removed when all of the
+    insertions have been removed.
+    '''
+
+    def __init__(self, words=None):
+        self.root = _Node('')
+        self.size = 0
+        if words is not None:
+            for word in words:
+                self.insert(word)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and node.count > 0
+
+    def _find(self, word):
+        node = self.root
+        i = 0
+        while i < len(word):
+            child = node.children.get(word[i])
+            if child is None or not word.startswith(child.label, i):
+                return None
+            i += len(child.label)
+            node = child
+        return node
+
+    def insert(self, word):
+        node = self.root
+        i = 0
+        while i < len(word):
+            child = node.children.get(word[i])
+            if child is None:
+                node.children[word[i]] = _Node(word[i:], count=1)
+                self.size += 1
+                return
+            common = _common_length(child.label, word[i:])
+            if common < len(child.label):
+                #split the edge at the first differing character
+                mid = _Node(child.label[:common])
+                child.label = child.label[common:]
+                mid.children[child.label[0]] = child
+                node.children[word[i]] = mid
+                child = mid
+            i += common
+            node = child
+
+        if node.count == 0:
+            self.size += 1
+        node.count += 1
+
+    def remove(self, word):
+        path = [self.root]
+        i = 0
+        while i < len(word):
+            child = path[-1].children.get(word[i])
+            if child is None or not word.startswith(child.label, i):
+                return
+            i += len(child.label)
+            path.append(child)
+
+        node = path[-1]
+        if node.count == 0:
+            return
+        node.count -= 1
+        if node.count > 0:
+            return
+        self.size -= 1
+
+        #prune the emptied leaf and merge single child chains back into one edge
+        while len(path) > 1:
+            node = path.pop()
+            parent = path[-1]
+            if node.count > 0:
+                break
+            if len(node.children) == 0:
+                del parent.children[node.label[0]]
+                continue
+            if len(node.children) == 1:
+                child = next(iter(node.children.values()))
+                child.label = node.label + child.label
+                parent.children[child.label[0]] = child
+            break
+
+    def _descend(self, prefix):
+        '''The node of the shortest word starting with `prefix` and that word'''
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            child = node.children.get(prefix[i])
+            if child is None:
+                return None, None
+            rest = prefix[i:]
+            if len(rest) <= len(child.label):
+                if not child.label.startswith(rest):
+                    return None, None
+                return child, prefix[:i] + child.label
+            if not rest.startswith(child.label):
+                return None, None
+            i += len(child.label)
+            node = child
+        return node, prefix
+
+    def complete(self, prefix, limit=None):
+        '''Sorted words starting with `prefix`, at most `limit` of them'''
+        node, base = self._descend(prefix)
+        if node is None:
+            return []
+
+        words = []
+        stack = [(base, node)]
+        while len(stack) > 0:
+            word, node = stack.pop()
+            if node.count > 0:
+                words.append(word)
+                if limit is not None and len(words) >= limit:
+                    break
+            for key in sorted(node.children, reverse=True):
+                child = node.children[key]
+                stack.append((word + child.label, child))
+        return words
+
+    def common_prefix(self, prefix):
+        '''Longest extension of `prefix` shared by all words starting with it'''
+        node, word = self._descend(prefix)
+        if node is None:
+            return prefix
+        while node.count == 0 and len(node.children) == 1:
+            node = next(iter(node.children.values()))
+            word += node.label
+        return word
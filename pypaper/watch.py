@@ -0,0 +1,138 @@
+import os
+import pathlib
+import queue
+import threading
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+from . import bib
+
+
+class FolderWatcher(threading.Thread):
+    '''Background thread watching folders for finished and removed files.
+
+    Uses inotify when `inotify_simple` is available and otherwise polls the
+    folders. Events are queued as (kind, path, data) and are applied by the
+    shell between commands, picked up bibtex files are already parsed here
+    so merging them does not block the prompt. If inotify drops events a
+    ("rescan", folder, None) event is queued per folder followed by a
+    "created" event for every file in it.
+    '''
+
+    def __init__(self, folders, interval=2.0):
+        super().__init__(daemon=True)
+        self.folders = [pathlib.Path(folder) for folder in folders]
+        self.interval = interval
+        self.events = queue.Queue()
+        self.stopped = threading.Event()
+
+    def start(self):
+        '''Set up the watches before the thread starts so files created right after are not missed'''
+        if inotify_simple is not None:
+            self._setup_inotify()
+        else:
+            self._setup_polling()
+        super().start()
+
+    def run(self):
+        if inotify_simple is not None:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def stop(self):
+        self.stopped.set()
+
+    def pending(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _put(self, kind, path):
+        data = None
+        if kind == 'created' and path.suffix == '.bib':
+            try:
+                data = bib.load_bibtex(path)
+            except Exception:
+                return
+        self.events.put((kind, path, data))
+
+    def _rescan(self):
+        '''Report all files again after events were lost'''
+        for folder in self.folders:
+            self.events.put(('rescan', folder, None))
+            for name in sorted(self._scan(folder)):
+                self._put('created', folder / name)
+
+    def _setup_inotify(self):
+        flags = inotify_simple.flags
+        self.inotify = inotify_simple.INotify()
+        self.watches = {}
+        for folder in self.folders:
+            wd = self.inotify.add_watch(
+                str(folder),
+                flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM,
+            )
+            self.watches[wd] = folder
+
+    def _run_inotify(self):
+        flags = inotify_simple.flags
+        while not self.stopped.is_set():
+            events = self.inotify.read(timeout=int(self.interval*1000))
+            if any(event.mask & flags.Q_OVERFLOW for event in events):
+                self._rescan()
+                continue
+            for event in events:
+                if event.wd not in self.watches or len(event.name) == 0:
+                    continue
+                path = self.watches[event.wd] / event.name
+                if event.mask & (flags.CLOSE_WRITE | flags.MOVED_TO):
+                    self._put('created', path)
+                else:
+                    self._put('removed', path)
+        self.inotify.close()
+
+    def _scan(self, folder):
+        files = {}
+        try:
+            for file in os.scandir(folder):
+                if file.is_file():
+                    stat = file.stat()
+                    files[file.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return files
+
+    def _setup_polling(self):
+        self.known = {folder: self._scan(folder) for folder in self.folders}
+
+    def _run_polling(self):
+        known = self.known
+        #files still being written are only reported once their size and mtime are stable
+        changing = {folder: {} for folder in self.folders}
+
+        while not self.stopped.wait(self.interval):
+            for folder in self.folders:
+                files = self._scan(folder)
+                for name in known[folder]:
+                    if name not in files:
+                        self._put('removed', folder / name)
+                for name in list(changing[folder]):
+                    if name not in files:
+                        del changing[folder][name]
+                for name, stat in files.items():
+                    if known[folder].get(name) == stat:
+                        continue
+                    if changing[folder].get(name) == stat:
+                        del changing[folder][name]
+                        self._put('created', folder / name)
+                    else:
+                        changing[folder][name] = stat
+                        files[name] = known[folder].get(name)
+                known[folder] = {name: stat for name, stat in files.items() if stat is not None}
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# pypaper creates its config and data folders in the home folder on import
+os.environ['HOME'] = tempfile.mkdtemp()
@@ -0,0 +1,44 @@
+import pathlib
+
+from pypaper import bib
+
+
+BIB_DATA = '''@inproceedings{Smith2018A_paper,
+  author = {Smith, A},
+  title = {A paper},
+  year = {2018},
+  crossref = {procs}
+}
+
+@proceedings{procs,
+ editor = {Doe, J},
+ title = {Proceedings of Things},
+ year = {2018}
+}
+'''
+
+
+def test_seeded_writer_saves_renamed_crossref(tmp_path):
+    path = pathlib.Path(tmp_path) / 'references.bib'
+    bib_database = bib.loads_bibtex(BIB_DATA)
+    writer = bib.CachedWriter()
+    writer.seed(BIB_DATA, bib_database)
+    renames = bib.rename_bibtex(bib_database)
+    assert 'procs' in renames
+
+    bib.save_bibtex(path, bib_database, writer)
+    saved = bib.load_bibtex(path)
+    child = [entry for entry in saved.entries if entry['ID'] == 'Smith2018A_paper'][0]
+    assert child['crossref'] == renames['procs']
+
+
+def test_seeded_writer_keeps_unchanged_text(tmp_path):
+    path = pathlib.Path(tmp_path) / 'references.bib'
+    bib_data = BIB_DATA.replace('procs', 'Doe_J2018Proceedings_of_Things')
+    bib_database = bib.loads_bibtex(bib_data)
+    writer = bib.CachedWriter()
+    writer.seed(bib_data, bib_database)
+    bib.rename_bibtex(bib_database)
+
+    bib.save_bibtex(path, bib_database, writer)
+    assert '  crossref = {Doe_J2018Proceedings_of_Things}\n' in path.read_text()
@@ -0,0 +1,40 @@
+from pypaper import cursor
+
+
+def counted(values, pulled):
+    for value in values:
+        pulled.append(value)
+        yield value
+
+
+def test_lazy_pages():
+    pulled = []
+    results = cursor.ResultCursor(counted(range(10), pulled))
+    assert results.page(3) == [(0, 0), (1, 1), (2, 2)]
+    assert pulled == [0, 1, 2]
+    assert results.found() == '3+'
+
+    assert results.has_next(3)
+    results.offset = 3
+    assert results.page(3) == [(3, 3), (4, 4), (5, 5)]
+    assert len(pulled) == 6
+
+
+def test_paging_back_does_not_rerun():
+    pulled = []
+    results = cursor.ResultCursor(counted(range(5), pulled))
+    results.offset = 3
+    results.page(2)
+    results.offset = 0
+    assert results.page(2) == [(0, 0), (1, 1)]
+    assert results[4] == 4
+    assert pulled == [0, 1, 2, 3, 4]
+
+
+def test_exhausted():
+    results = cursor.ResultCursor(iter([7, 8]))
+    assert not results.has_next(2)
+    assert results.all() == [7, 8]
+    assert results.found() == '2'
+    results.offset = 2
+    assert results.page(5) == []
@@ -0,0 +1,95 @@
+from pypaper import bib
+from pypaper import export
+
+
+TEX = r'''
+\documentclass{article}
+\begin{document}
+As shown by \cite{Smith2018} {\bf bold} and \citep[see][p.~3]{Doe2019, Lee2020}.
+% \cite{Commented2000}
+A 50\% increase \parencite*{Escaped2001}.
+\cites[see][]{Multi2002}[p.~4]{Multi2003} {\it not a key}
+\textcite {Spaced2004}
+\nocite{*}
+\end{document}
+'''
+
+AUX = r'''\relax
+\citation{Smith2018}
+\citation{Doe2019,Lee2020}
+\abx@aux@cite{0}{Multi2002}
+'''
+
+BCF = '''<bcf:section number="0">
+<bcf:citekey order="1">Smith2018</bcf:citekey>
+<bcf:citekey order="2">Doe2019</bcf:citekey>
+</bcf:section>
+'''
+
+
+def test_collect_tex(tmp_path):
+    path = tmp_path / 'paper.tex'
+    path.write_text(TEX)
+    assert export.collect_citations([path]) == [
+        'Smith2018', 'Doe2019', 'Lee2020', 'Escaped2001', 'Multi2002', 'Multi2003', 'Spaced2004', '*',
+    ]
+
+
+def test_collect_aux_and_bcf(tmp_path):
+    aux = tmp_path / 'paper.aux'
+    aux.write_text(AUX)
+    bcf = tmp_path / 'paper.bcf'
+    bcf.write_text(BCF)
+    assert export.collect_citations([aux]) == ['Smith2018', 'Doe2019', 'Lee2020', 'Multi2002']
+    assert export.collect_citations([bcf]) == ['Smith2018', 'Doe2019']
+    assert export.project_files(tmp_path) == [bcf]
+
+
+BIB_DATA = '''@string{mon = "Early spring"}
+@string{org = "Meteor Society"}
+@string{pub = org # " Press"}
+@string{unused = "Unused"}
+
+@proceedings{procs,
+  title = {Proceedings of Things},
+  publisher = pub,
+  year = {2018}
+}
+
+@inproceedings{Smith2018,
+  author = {Smith, A},
+  title = {A paper},
+  crossref = {procs}
+}
+
+@article{Doe2019,
+  author = {Doe, J},
+  title = {Another paper},
+  month = mon
+}
+'''
+
+
+def load_database():
+    bib_database = bib.loads_bibtex(BIB_DATA)
+    id_index = {entry['ID']: id_ for id_, entry in enumerate(bib_database.entries)}
+    return bib_database, id_index
+
+
+def test_subset_crossref_and_strings():
+    bib_database, id_index = load_database()
+    subset, missing = export.subset_database(bib_database, id_index, ['Smith2018', 'Missing2000'])
+
+    assert missing == ['Missing2000']
+    assert [entry['ID'] for entry in subset.entries] == ['Smith2018', 'procs']
+    assert list(subset.strings) == ['org', 'pub']
+
+
+def test_subset_all():
+    bib_database, id_index = load_database()
+    subset, missing = export.subset_database(bib_database, id_index, ['*'])
+
+    assert missing == []
+    ids = [entry['ID'] for entry in bib_database.entries if entry['ID'] != 'procs']
+    assert [entry['ID'] for entry in subset.entries] == ids + ['procs']
+    assert list(subset.strings) == ['mon', 'org', 'pub']
@@ -0,0 +1,64 @@
+import os
+
+from pypaper import integrity
+
+
+PDF = b'%PDF-1.4\n' + b'0' * 4096 + b'\n%%EOF\n'
+
+
+def write(folder, name, content):
+    path = folder / name
+    path.write_bytes(content)
+    return path
+
+
+def test_check_pdf(tmp_path):
+    assert integrity.check_pdf(write(tmp_path, 'ok.pdf', PDF)) is None
+    assert integrity.check_pdf(write(tmp_path, 'empty.pdf', b'')) == 'empty file'
+    assert integrity.check_pdf(write(tmp_path, 'page.pdf', b'<!DOCTYPE html><html></html>')) == 'HTML page'
+    assert integrity.check_pdf(write(tmp_path, 'text.pdf', b'plain text')) == 'no PDF header'
+    assert integrity.check_pdf(write(tmp_path, 'cut.pdf', PDF[:2048])) == 'truncated, no %%EOF trailer'
+    assert integrity.check_pdf(tmp_path / 'missing.pdf').startswith('unreadable')
+
+
+def test_scan_cache(tmp_path):
+    papers = tmp_path / 'PAPERS'
+    papers.mkdir()
+    write(papers, 'A2018.pdf', PDF)
+    write(papers, 'B2018.pdf', b'')
+    write(papers, 'notes.txt', b'')
+    cache_path = tmp_path / 'integrity.json'
+
+    results, checked = integrity.scan(papers, cache=integrity.ScanCache(cache_path))
+    assert results == {'A2018.pdf': None, 'B2018.pdf': 'empty file'}
+    assert checked == 2
+
+    #only changed files are checked again, results of removed files are dropped
+    path = write(papers, 'B2018.pdf', PDF)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    os.remove(papers / 'A2018.pdf')
+    cache = integrity.ScanCache(cache_path)
+    results, checked = integrity.scan(papers, cache=cache)
+    assert results == {'B2018.pdf': None}
+    assert checked == 1
+    assert list(integrity.ScanCache(cache_path).results) == ['B2018.pdf']
+
+
+def test_scan_cache_deep(tmp_path):
+    path = write(tmp_path, 'A2018.pdf', PDF)
+    cache = integrity.ScanCache(tmp_path / 'integrity.json')
+    cache.set(path.name, path.stat(), False, None)
+    #a file only checked shallowly has to be checked again for a deep scan
+    assert cache.get(path.name, path.stat(), False) is None
+    assert cache.get(path.name, path.stat(), True) is False
+    cache.set(path.name, path.stat(), False, 'no PDF header')
+    assert cache.get(path.name, path.stat(), True) == 'no PDF header'
+
+
+def test_check_pdf_deep(tmp_path):
+    if integrity.PDFParser is None:
+        return
+    path = write(tmp_path, 'broken.pdf', PDF)
+    assert integrity.check_pdf(path) is None
+    assert integrity.check_pdf(path, deep=True).startswith('pdfminer failed to open')
@@ -0,0 +1,50 @@
+from pypaper import match
+
+
+ENTRIES = [
+    {'ID': 'A2018', 'title': 'Orbital uncertainties of meteors', 'author': 'Smith, A', 'doi': '10.1000/xyz'},
+    {'ID': 'B2018', 'title': 'Unrelated work', 'author': 'Doe, J'},
+]
+
+
+def test_doi_match_wins_tie():
+    index = match.LibraryIndex(ENTRIES)
+    title_front = {'lines': ['Orbital uncertainties of meteors', 'A. Smith'], 'dois': []}
+    doi_front = {'lines': ['Something else'], 'dois': ['10.1000/xyz']}
+
+    assert index.match(title_front, num=1)[0][0] == 1.0
+    matches = match.match_documents(index, [title_front, doi_front], 0.5)
+    assert matches == [(1, 1.0, 0, True)]
+
+
+def test_short_title_in_abstract():
+    entries = [
+        {'ID': 'Jones2019', 'title': 'Meteor radar observations', 'author': 'Jones, B'},
+        {'ID': 'Lee2020', 'title': 'Seasonal variation of winds in the mesosphere', 'author': 'Lee, C'},
+    ]
+    index = match.LibraryIndex(entries)
+    front = {
+        'lines': [
+            'Seasonal variation of winds',
+            'in the mesosphere',
+            'C. Lee and D. Park',
+            'Abstract',
+            'We use meteor radar observations from two sites to study',
+            'the seasonal variation of the mean winds.',
+        ],
+        'dois': [],
+    }
+    ranked = index.match(front)
+    assert ranked[0][:2] == (1.0, 1)
+    assert all(score < 0.7 for score, id_, doi in ranked if id_ == 0)
+    assert match.match_documents(index, [front], 0.7) == [(0, 1.0, 1, False)]
+
+
+def test_author_breaks_ties():
+    entries = [
+        {'ID': 'Doe2010', 'title': 'Meteor showers', 'author': 'Doe, J'},
+        {'ID': 'Smith2012', 'title': 'Meteor showers', 'author': 'Smith, A'},
+    ]
+    index = match.LibraryIndex(entries)
+    front = {'lines': ['Meteor showers', 'A. Smith'], 'dois': []}
+    assert [id_ for score, id_, doi in index.match(front)] == [1, 0]
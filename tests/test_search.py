@@ -0,0 +1,92 @@
+import bibtexparser
+
+from pypaper import shell
+
+
+def make_shell(entries):
+    prompt = shell.Shell()
+    prompt.setup()
+    prompt.bibtex = bibtexparser.bibdatabase.BibDatabase()
+    prompt.bibtex.entries = entries
+    prompt._reindex()
+    prompt._reset_cursor()
+    return prompt
+
+
+ENTRIES = [
+    {'ID': 'A2009', 'ENTRYTYPE': 'article', 'title': 'First', 'year': '2009', 'tags': 'radar'},
+    {'ID': 'B2012', 'ENTRYTYPE': 'article', 'title': 'Second', 'year': '2012', 'tags': 'radar'},
+    {'ID': 'C2018', 'ENTRYTYPE': 'book', 'title': 'Third', 'year': '2018'},
+]
+
+
+def test_query_without_operator(capsys):
+    prompt = make_shell([dict(entry) for entry in ENTRIES])
+    prompt.do_bib('foo')
+    assert 'No matches' in capsys.readouterr().out
+
+    prompt.do_bib('--tag radar foo')
+    assert 'No matches' in capsys.readouterr().out
+
+
+def test_column_predicates():
+    prompt = make_shell([dict(entry) for entry in ENTRIES])
+    prompt.do_bib('year>=2010')
+    assert prompt.current_bibtex.all() == [1, 2]
+    prompt.do_bib('year=2009..2012 & entrytype=article')
+    assert prompt.current_bibtex.all() == [0, 1]
+
+
+def test_partial_year_is_regex():
+    prompt = make_shell([dict(entry) for entry in ENTRIES])
+    prompt.do_bib('year=201')
+    assert prompt.current_bibtex.all() == [1, 2]
+    prompt.do_bib('year=2012')
+    assert prompt.current_bibtex.all() == [1]
+
+
+def test_bulk_set_asks_first(monkeypatch):
+    prompt = make_shell([dict(entry) for entry in ENTRIES])
+    monkeypatch.setattr(prompt, 'do_save', lambda args: None)
+
+    monkeypatch.setattr(shell.inquirer, 'prompt', lambda questions: {'set': False})
+    prompt.do_bulk('set note=x')
+    assert all('note' not in entry for entry in prompt.bibtex.entries)
+
+    monkeypatch.setattr(shell.inquirer, 'prompt', lambda questions: {'set': True})
+    prompt.do_bulk('set note=x')
+    assert all(entry['note'] == 'x' for entry in prompt.bibtex.entries)
+
+
+def test_bulk_tag_asks_first(monkeypatch):
+    prompt = make_shell([dict(entry) for entry in ENTRIES])
+    monkeypatch.setattr(prompt, 'do_save', lambda args: None)
+
+    monkeypatch.setattr(shell.inquirer, 'prompt', lambda questions: {'tag': False})
+    prompt.do_bulk('tag -radar')
+    assert prompt.tag_index.counts() == [('radar', 2)]
+
+    monkeypatch.setattr(shell.inquirer, 'prompt', lambda questions: {'tag': True})
+    prompt.do_bulk('tag meteor, -radar')
+    assert prompt.tag_index.counts() == [('meteor', 3)]
+
+
+# readline's default word delimiters
+DELIMS = ' \t\n`~!@#$%^&*()-=+[{]}\\|;:\'",<>/?'
+
+
+def complete(prompt, line):
+    begidx = max(line.rfind(char) for char in DELIMS) + 1
+    return prompt.complete_bib(line[begidx:], line, begidx, len(line))
+
+
+def test_complete_bib():
+    prompt = make_shell([dict(entry) for entry in ENTRIES])
+    assert complete(prompt, 'bib --li') == ['limit']
+    assert complete(prompt, 'bib --') == ['limit', 'offset', 'tag', 'fold', 'exact']
+    assert complete(prompt, 'bib --tag ra') == ['radar']
+    assert complete(prompt, 'bib ti') == ['title=']
+    assert complete(prompt, 'bib year>2010&ti') == ['title=']
+    assert complete(prompt, 'bib title=') == []
+    assert complete(prompt, 'bib title=fi') == []
+    assert prompt.complete_bib('--fo', 'bib --fo', 4, 8) == ['--fold']
@@ -0,0 +1,92 @@
+import pytest
+
+from pypaper import config
+from pypaper import store
+
+
+@pytest.fixture
+def paper_store(tmp_path, monkeypatch):
+    for name in ['PAPERS', 'BLOBS', 'TRASH', 'PICKUP']:
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(config, 'PAPERS_FOLDER', tmp_path / 'PAPERS')
+    monkeypatch.setattr(config, 'BLOB_FOLDER', tmp_path / 'BLOBS')
+    monkeypatch.setattr(config, 'TRASH_FOLDER', tmp_path / 'TRASH')
+    monkeypatch.setattr(config, 'PICKUP_FOLDER', tmp_path / 'PICKUP')
+    monkeypatch.setattr(config, 'MANIFEST_FILE', tmp_path / 'manifest.json')
+    papers = store.PaperStore()
+    papers.load()
+    return papers
+
+
+def pickup(name, content):
+    path = config.PICKUP_FOLDER / name
+    path.write_bytes(content)
+    return path
+
+
+def test_ids_is_a_snapshot(paper_store):
+    paper_store.add(pickup('a.pdf', b'%PDF-a'), 'A2018')
+    ids = paper_store.ids()
+    paper_store.add(pickup('b.pdf', b'%PDF-b'), 'B2018')
+    assert ids == ['A2018']
+    assert sorted(paper_store.ids()) == ['A2018', 'B2018']
+
+
+def test_replaced_pdfs_are_all_kept(paper_store):
+    for content in [b'%PDF-1', b'%PDF-2', b'%PDF-3']:
+        paper_store.add(pickup('a.pdf', content), 'A2018')
+    trashed = sorted(path.read_bytes() for path in config.TRASH_FOLDER.iterdir())
+    assert trashed == [b'%PDF-1', b'%PDF-2']
+    assert paper_store.resolve('A2018').read_bytes() == b'%PDF-3'
+
+
+def test_add_links_and_deduplicates(paper_store):
+    blob = paper_store.add(pickup('a.pdf', b'%PDF-same'), 'A2018')
+    assert blob == paper_store.blob_path(store.hash_file(blob))
+    assert paper_store.paper_path('A2018').read_bytes() == b'%PDF-same'
+    assert not (config.PICKUP_FOLDER / 'a.pdf').exists()
+
+    paper_store.add(pickup('b.pdf', b'%PDF-same'), 'B2018')
+    assert len(list(config.BLOB_FOLDER.iterdir())) == 1
+    assert paper_store.resolve('B2018') == paper_store.paper_path('B2018')
+
+
+def test_rename(paper_store):
+    paper_store.add(pickup('a.pdf', b'%PDF-a'), 'A2018')
+    paper_store.rename('A2018', 'A2018b')
+    assert 'A2018' not in paper_store
+    assert not paper_store.paper_path('A2018').exists()
+    assert paper_store.resolve('A2018b').read_bytes() == b'%PDF-a'
+
+    #the PDF of an ID that already has one is dropped
+    paper_store.add(pickup('b.pdf', b'%PDF-b'), 'B2018')
+    paper_store.rename('B2018', 'A2018b')
+    assert paper_store.ids() == ['A2018b']
+    assert paper_store.resolve('A2018b').read_bytes() == b'%PDF-a'
+    assert [path.read_bytes() for path in config.TRASH_FOLDER.iterdir()] == [b'%PDF-b']
+
+
+def test_remove_keeps_shared_blobs(paper_store):
+    paper_store.add(pickup('a.pdf', b'%PDF-same'), 'A2018')
+    paper_store.add(pickup('b.pdf', b'%PDF-same'), 'B2018')
+    paper_store.remove('A2018')
+    assert paper_store.resolve('A2018') is None
+    assert paper_store.resolve('B2018').read_bytes() == b'%PDF-same'
+    assert list(config.TRASH_FOLDER.iterdir()) == []
+
+    paper_store.remove('B2018')
+    assert len(paper_store) == 0
+    assert list(config.BLOB_FOLDER.iterdir()) == []
+    assert [path.name for path in config.TRASH_FOLDER.iterdir()] == ['B2018.pdf']
+
+
+def test_manifest_and_imports(paper_store):
+    paper_store.add(pickup('a.pdf', b'%PDF-a'), 'A2018')
+    (config.PAPERS_FOLDER / 'C2020.pdf').write_bytes(b'%PDF-c')
+
+    loaded = store.PaperStore()
+    loaded.load()
+    assert sorted(loaded.ids()) == ['A2018', 'C2020']
+    assert loaded.verify() == []
+    loaded.blob_path(loaded.papers['C2020']).write_bytes(b'%PDF-changed')
+    assert loaded.verify() == [('C2020', 'hash mismatch')]
@@ -0,0 +1,52 @@
+from pypaper import bib
+from pypaper import sync
+
+
+BIB_DATA = '''@article{A2018First,
+  author = {A},
+  title = {First},
+  year = {2018}
+}
+
+@article{B2018Second,
+  author = {B},
+  title = {Second},
+  year = {2018}
+}
+'''
+
+
+def load(bib_data):
+    bib_database = bib.loads_bibtex(bib_data)
+    snapshot = sync.Snapshot()
+    snapshot.record(None, bib_data, bib_database)
+    return bib_database, snapshot
+
+
+def test_reserialized_entries_are_not_remote_changes():
+    mine, snapshot = load(BIB_DATA)
+    mine.entries[0]['note'] = 'local'
+
+    #another process changes the second entry and re-serializes all of them
+    theirs = bib.loads_bibtex(BIB_DATA)
+    theirs.entries[1]['note'] = 'remote'
+    bib_data = bib.CachedWriter().dumps(theirs)
+
+    updated, added, removed, conflicts = snapshot.merge(bib_data, mine)
+    assert conflicts == []
+    assert (updated, added, removed) == (1, 0, 0)
+    assert mine.entries[0]['note'] == 'local'
+    assert mine.entries[1]['note'] == 'remote'
+
+
+def test_changes_on_both_sides_conflict():
+    mine, snapshot = load(BIB_DATA)
+    mine.entries[0]['note'] = 'local'
+
+    theirs = bib.loads_bibtex(BIB_DATA)
+    theirs.entries[0]['note'] = 'remote'
+    bib_data = bib.CachedWriter().dumps(theirs)
+
+    updated, added, removed, conflicts = snapshot.merge(bib_data, mine)
+    assert conflicts == ['A2018First']
+    assert mine.entries[0]['note'] == 'local'
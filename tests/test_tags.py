@@ -0,0 +1,52 @@
+import pytest
+
+from pypaper import tags
+
+
+ENTRIES = [
+    {'ID': 'A', 'tags': 'radar,meteor'},
+    {'ID': 'B', 'tags': 'radar'},
+    {'ID': 'C', 'tags': 'optical, meteor'},
+    {'ID': 'D'},
+]
+UNIVERSE = range(len(ENTRIES))
+
+
+def test_query_operators():
+    index = tags.TagIndex(ENTRIES)
+    assert index.query('radar', UNIVERSE) == {0, 1}
+    assert index.query('radar & meteor', UNIVERSE) == {0}
+    assert index.query('radar | optical', UNIVERSE) == {0, 1, 2}
+    assert index.query('radar, optical', UNIVERSE) == {0, 1, 2}
+    assert index.query('!radar', UNIVERSE) == {2, 3}
+    assert index.query('!!radar', UNIVERSE) == {0, 1}
+    assert index.query('unknown', UNIVERSE) == set()
+
+
+def test_query_precedence_and_groups():
+    index = tags.TagIndex(ENTRIES)
+    #"&" binds tighter than "|"
+    assert index.query('optical | radar & meteor', UNIVERSE) == {0, 2}
+    assert index.query('(optical | radar) & meteor', UNIVERSE) == {0, 2}
+    assert index.query('(optical | radar) & !meteor', UNIVERSE) == {1}
+
+
+@pytest.mark.parametrize('expr', ['radar &', '(radar', 'radar)', '& radar', '!'])
+def test_query_errors(expr):
+    index = tags.TagIndex(ENTRIES)
+    with pytest.raises(ValueError):
+        index.query(expr, UNIVERSE)
+
+
+def test_index_add_remove():
+    index = tags.TagIndex(ENTRIES)
+    index.remove(2, ENTRIES[2])
+    assert index.get('optical') == set()
+    assert index.trie.complete('o') == []
+    assert index.counts() == [('radar', 2), ('meteor', 1)]
+
+
+def test_update_tags_keeps_order():
+    current = tags.split_tags('b, a,b,,c')
+    assert current == ['b', 'a', 'c']
+    assert tags.update_tags(current, ['d', 'a'], ['b']) == ['a', 'c', 'd']
@@ -0,0 +1,40 @@
+import time
+
+from pypaper import watch
+
+
+def wait_for(watcher, count, timeout=5.0):
+    events = []
+    end = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < end:
+        events += watcher.pending()
+        time.sleep(0.05)
+    return events
+
+
+def test_files_right_after_start(tmp_path):
+    watcher = watch.FolderWatcher([tmp_path], interval=0.1)
+    watcher.start()
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF-')
+    events = wait_for(watcher, 1)
+    watcher.stop()
+    assert [(kind, path.name) for kind, path, data in events] == [('created', 'a.pdf')]
+
+
+def test_files_right_after_start_polling(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch, 'inotify_simple', None)
+    watcher = watch.FolderWatcher([tmp_path], interval=0.1)
+    watcher.start()
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF-')
+    events = wait_for(watcher, 1)
+    watcher.stop()
+    assert [(kind, path.name) for kind, path, data in events] == [('created', 'a.pdf')]
+
+
+def test_rescan_reports_all_files(tmp_path):
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF-')
+    (tmp_path / 'b.pdf').write_bytes(b'%PDF-')
+    watcher = watch.FolderWatcher([tmp_path])
+    watcher._rescan()
+    events = [(kind, path.name) for kind, path, data in watcher.pending()]
+    assert events == [('rescan', tmp_path.name), ('created', 'a.pdf'), ('created', 'b.pdf')]